@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmarks of the client-side orchestration overhead (Python 3 only).
+
+Runs against a MockNutchServer started in a subprocess (or the server given with --endpoint), so only the
+client is measured in this process:
+
+    round    calls and wall time per round of a CrawlClient
+    jobs     throughput of JobClient.create and JobClient.list
+    seeds    time and peak memory (tracemalloc) of SeedClient.create for each --seed-sizes
+    scaling  wall time and calls to drive 1/10/100/1000 concurrent crawls, with a shared JobPoller
+             and with AsyncNutch
+
+Results are written as JSON (to stdout, or --output).  Pass a previous result with --compare to fail
+(exit status 1) when a timing got more than --tolerance slower:
+
+    python benchmarks/bench_client.py --output baseline.json
+    python benchmarks/bench_client.py --compare baseline.json
+"""
+
+import argparse
+import asyncio
+from datetime import datetime
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+from time import perf_counter, sleep
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import nutch
+from nutch.aio import AsyncNutch
+
+Benchmarks = ['round', 'jobs', 'seeds', 'scaling']
+Seeds = ['http://host%d.example.com/' % i for i in range(10)]
+
+
+def startMockServer(duration):
+    """Start `python -m nutch.mockserver` on a free port, and return (process, endpoint)"""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    process = subprocess.Popen([sys.executable, '-m', 'nutch.mockserver', '--port', str(port),
+                                '--duration', str(duration)],
+                               cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir),
+                               stdout=subprocess.DEVNULL)
+    endpoint = 'http://127.0.0.1:%d' % port
+    server = nutch.Server(endpoint, retryPolicy=nutch.RetryPolicy(0))
+    for attempt in range(100):
+        try:
+            server.call('get', '/admin')
+            return process, endpoint
+        except Exception:
+            sleep(0.1)
+    process.kill()
+    raise RuntimeError("Mock Nutch server did not start on %s" % endpoint)
+
+
+def requestCounts(server):
+    """:return: the number of calls per endpoint made through server"""
+    return dict((key, stats['count']) for key, stats in server.metrics()['requests'].items())
+
+
+def benchRound(endpoint, rounds):
+    """Calls and wall time per round of one crawl, with the default polling"""
+    nt = nutch.Nutch(serverEndpoint=endpoint)
+    started = perf_counter()
+    cc = nt.Crawl(Seeds, jobClient=nt.Jobs('bench_round'), rounds=rounds)
+    results = []
+    requests = 0
+    while cc.currentRound <= cc.totalRounds:
+        jobs = cc.nextRound()
+        finished = perf_counter()
+        results.append({'round': len(results) + 1, 'jobs': len(jobs), 'requests': cc.requestCount - requests,
+                        'seconds': finished - started})
+        requests = cc.requestCount
+        started = finished
+    return {'rounds': results, 'requestsByEndpoint': requestCounts(nt.server)}
+
+
+def benchJobs(endpoint, count):
+    """Throughput of JobClient.create and JobClient.list"""
+    nt = nutch.Nutch(serverEndpoint=endpoint)
+    jc = nt.Jobs('bench_jobs')
+    started = perf_counter()
+    for i in range(count):
+        jc.create('GENERATE')
+    create = perf_counter() - started
+    started = perf_counter()
+    for i in range(count):
+        jobs = jc.list()
+    listing = perf_counter() - started
+    return {'create': {'calls': count, 'seconds': create, 'perSecond': count / create},
+            'list': {'calls': count, 'jobsListed': len(jobs), 'seconds': listing, 'perSecond': count / listing}}
+
+
+def benchSeeds(endpoint, sizes):
+    """Time and peak memory of SeedClient.create"""
+    sc = nutch.Nutch(serverEndpoint=endpoint).Seeds()
+    results = {}
+    for size in sizes:
+        urls = ('http://host%d.example.com/page%d' % (i % 1000, i) for i in range(size))
+        tracemalloc.start()
+        started = perf_counter()
+        sc.create('bench_seeds_%d' % size, urls)
+        seconds = perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[str(size)] = {'urls': size, 'seconds': seconds, 'peakBytes': peak, 'bytesPerUrl': peak / size}
+    return results
+
+
+def benchScalingPoller(endpoint, crawls, interval):
+    """Drive crawls from one thread with progress(), reading job states from a shared JobPoller"""
+    nt = nutch.Nutch(serverEndpoint=endpoint)
+    poller = nt.JobPoller(interval)
+    try:
+        started = perf_counter()
+        clients = [nt.Crawl(Seeds, jobClient=nt.Jobs('bench_poller_%d_%d' % (crawls, i), poller), index=False)
+                   for i in range(crawls)]
+        launched = perf_counter()
+        active = clients
+        while active:
+            active = [cc for cc in active if cc.progress() is not None]
+            if active:
+                poller.wait(interval)
+        finished = perf_counter()
+    finally:
+        poller.stop()
+    requests = sum(requestCounts(nt.server).values())
+    return {'launchSeconds': launched - started, 'seconds': finished - started, 'requests': requests,
+            'requestsPerCrawl': requests / crawls}
+
+
+def benchScalingAsync(endpoint, crawls, maxInFlight):
+    """Drive crawls with AsyncNutch, each crawl polling on its own"""
+
+    async def run():
+        ant = await AsyncNutch.connect(serverEndpoint=endpoint, maxInFlight=maxInFlight)
+        try:
+            started = perf_counter()
+            clients = await asyncio.gather(*[
+                ant.Crawl(Seeds, jobClient=ant.nutch.Jobs('bench_async_%d_%d' % (crawls, i)), index=False)
+                for i in range(crawls)])
+            launched = perf_counter()
+            await asyncio.gather(*[cc.waitAll() for cc in clients])
+            finished = perf_counter()
+            return launched - started, finished - started, sum(requestCounts(ant.nutch.server).values())
+        finally:
+            ant.close()
+
+    launch, seconds, requests = asyncio.run(run())
+    return {'launchSeconds': launch, 'seconds': seconds, 'requests': requests, 'requestsPerCrawl': requests / crawls}
+
+
+def benchScaling(endpoint, counts, interval, maxInFlight):
+    return {
+        'poller': dict((str(count), benchScalingPoller(endpoint, count, interval)) for count in counts),
+        'async': dict((str(count), benchScalingAsync(endpoint, count, maxInFlight)) for count in counts),
+    }
+
+
+def timings(results, path=()):
+    """Yield (path, seconds) for every 'seconds' entry of results"""
+    for key, value in results.items():
+        if isinstance(value, dict):
+            for timing in timings(value, path + (key,)):
+                yield timing
+        elif isinstance(value, list):
+            for i, item in enumerate(value):
+                for timing in timings(item, path + (key, str(i))):
+                    yield timing
+        elif key == 'seconds':
+            yield '/'.join(path), value
+
+
+def compare(baseline, results, tolerance):
+    """:return: the timings of results more than tolerance slower than in baseline"""
+    old = dict(timings(baseline['results']))
+    regressions = []
+    for path, seconds in timings(results['results']):
+        if path in old and seconds > old[path] * (1 + tolerance):
+            regressions.append({'benchmark': path, 'baseline': old[path], 'seconds': seconds,
+                                'ratio': seconds / old[path]})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the Nutch client against a mock server")
+    parser.add_argument('benchmarks', nargs='*', default=Benchmarks,
+                        help='Benchmarks to run, among %s, by default all' % ', '.join(Benchmarks))
+    parser.add_argument('--endpoint', help='Nutch server to use instead of starting a mock server')
+    parser.add_argument('--duration', type=float, default=0.05, help='Seconds each job runs on the mock server')
+    parser.add_argument('--rounds', type=int, default=3, help='Rounds of the round benchmark')
+    parser.add_argument('--jobs', type=int, default=500, help='Calls of the jobs benchmark')
+    parser.add_argument('--seed-sizes', type=int, nargs='+', default=[1000, 1000000],
+                        help='Seed list sizes of the seeds benchmark')
+    parser.add_argument('--crawls', type=int, nargs='+', default=[1, 10, 100, 1000],
+                        help='Numbers of concurrent crawls of the scaling benchmark')
+    parser.add_argument('--interval', type=float, default=0.5, help='Interval of the JobPoller of the scaling benchmark')
+    parser.add_argument('--max-in-flight', type=int, default=16, help='Concurrent requests of AsyncNutch')
+    parser.add_argument('-o', '--output', help='File to write the results to, by default stdout')
+    parser.add_argument('--compare', help='Previous results to compare timings with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed slowdown against --compare, as a fraction')
+    args = parser.parse_args(argv)
+    for name in args.benchmarks:
+        if name not in Benchmarks:
+            parser.error('unknown benchmark: %s' % name)
+
+    process = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        process, endpoint = startMockServer(args.duration)
+    try:
+        results = {}
+        for name in args.benchmarks:
+            sys.stderr.write('Running %s benchmark\n' % name)
+            if name == 'round':
+                results[name] = benchRound(endpoint, args.rounds)
+            elif name == 'jobs':
+                results[name] = benchJobs(endpoint, args.jobs)
+            elif name == 'seeds':
+                results[name] = benchSeeds(endpoint, args.seed_sizes)
+            elif name == 'scaling':
+                results[name] = benchScaling(endpoint, args.crawls, args.interval, args.max_in_flight)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    report = {
+        'meta': {'date': datetime.now().isoformat(), 'python': platform.python_version(),
+                 'platform': platform.platform(), 'endpoint': args.endpoint or 'mock',
+                 'arguments': dict((key, value) for key, value in vars(args).items()
+                                   if key not in ('output', 'compare'))},
+        'results': results,
+    }
+    status = 0
+    if args.compare:
+        with open(args.compare) as f:
+            report['regressions'] = compare(json.load(f), report, args.tolerance)
+        status = 1 if report['regressions'] else 0
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
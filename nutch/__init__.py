@@ -14,4 +14,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from .nutch import Nutch, NutchException, Job, Config
+from .nutch import (Nutch, NutchException, NutchCircuitOpenException, Job, Config, Server, ServerPool, JobPoller,
+                    JobScheduler, RetryPolicy, CircuitBreaker, SeedFilter, ClientMetrics, RoundReport,
+                    writeRoundReportsCsv, writeRoundReportsJson, Middleware, TimingMiddleware, SlowCallMiddleware,
+                    ProfilingMiddleware, TraceIdMiddleware, Pipeline, PipelineNode, everyNthRound, CrawlCheckpoint,
+                    CrawlEvent)
@@ -0,0 +1,424 @@
+# encoding: utf-8
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+asyncio front-end for the Nutch REST client (Python 3 only).
+
+The Async* classes mirror Server, Nutch, JobClient, ConfigClient, SeedClient and CrawlClient.
+Each REST call is handed to a bounded thread pool that shares the pooled connections of one
+Server, so the number of in-flight requests never exceeds maxInFlight, while waiting between
+polls is a plain asyncio.sleep.  One event loop can drive thousands of crawls this way:
+
+    async def main():
+        nt = await AsyncNutch.connect(maxInFlight=16)
+        crawls = [await nt.Crawl(seed) for seed in seeds]
+        await asyncio.gather(*[cc.waitAll() for cc in crawls])
+"""
+
+import asyncio
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import functools
+
+from .nutch import (Nutch, NutchCrawlException, Server, DefaultConfig, DefaultSeedChunkSize,
+                    DefaultServerEndpoint, IdEqualityMixin)
+
+DefaultMaxInFlight = 10
+
+
+class AsyncServer(object):
+    """
+    Awaitable wrapper around a Server
+    """
+
+    def __init__(self, server, maxInFlight=DefaultMaxInFlight):
+        """
+        :param server: the Server or ServerPool to wrap, or the URL of a Nutch server
+        :param maxInFlight: maximum number of concurrent requests to the server
+        """
+        if not hasattr(server, 'call'):
+            server = Server(server, poolMaxSize=maxInFlight)
+        self.server = server
+        self.maxInFlight = maxInFlight
+        self.executor = ThreadPoolExecutor(maxInFlight)
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking client function in the request pool and return its result"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    async def call(self, verb, servicePath, **kwargs):
+        """Awaitable Server.call"""
+        return await self.run(self.server.call, verb, servicePath, **kwargs)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.server.close()
+
+
+class AsyncJob(IdEqualityMixin):
+    """
+    Awaitable counterpart of Job
+    """
+
+    def __init__(self, job, aserver):
+        self.job = job
+        self.aserver = aserver
+
+    @property
+    def id(self):
+        """The id of the job, None while it is queued by a JobScheduler"""
+        return self.job.id
+
+    async def info(self):
+        return await self.aserver.run(self.job.info)
+
+    async def stop(self):
+        return await self.aserver.run(self.job.stop)
+
+    async def abort(self):
+        return await self.aserver.run(self.job.abort)
+
+
+class AsyncConfig(IdEqualityMixin):
+    """
+    Awaitable counterpart of Config
+
+    config[param] returns an awaitable; use set() instead of item assignment.
+    """
+
+    def __init__(self, config, aserver):
+        self.config = config
+        self.id = config.id
+        self.aserver = aserver
+
+    def __str__(self):
+        return "AsyncConfig(id:%s, ...)" % self.id
+
+    async def delete(self):
+        return await self.aserver.run(self.config.delete)
+
+    async def info(self):
+        return await self.aserver.run(self.config.info)
+
+    async def params(self):
+        return await self.aserver.run(self.config.params)
+
+    def invalidate(self):
+        self.config.invalidate()
+
+    async def parameter(self, parameterId):
+        return await self.aserver.run(self.config.parameter, parameterId)
+
+    def __getitem__(self, item):
+        return self.aserver.run(self.config.__getitem__, item)
+
+    async def set(self, key, value):
+        return await self.aserver.run(self.config.__setitem__, key, value)
+
+    async def update(self, mapping, **kwargs):
+        return await self.aserver.run(self.config.update, mapping, **kwargs)
+
+
+class AsyncConfigClient(object):
+    """
+    Awaitable counterpart of ConfigClient
+    """
+
+    def __init__(self, configClient, aserver):
+        self.configClient = configClient
+        self.aserver = aserver
+
+    async def list(self):
+        configs = await self.aserver.run(self.configClient.list)
+        return [AsyncConfig(config, self.aserver) for config in configs]
+
+    async def create(self, cid, configData):
+        config = await self.aserver.run(self.configClient.create, cid, configData)
+        return AsyncConfig(config, self.aserver)
+
+    async def get(self, cid):
+        """Return the AsyncConfig named cid, raise KeyError if it does not exist"""
+        config = await self.aserver.run(self.configClient.__getitem__, cid)
+        return AsyncConfig(config, self.aserver)
+
+
+class AsyncJobClient(object):
+    """
+    Awaitable counterpart of JobClient
+    """
+
+    def __init__(self, jobClient, aserver):
+        self.jobClient = jobClient
+        self.crawlId = jobClient.crawlId
+        self.confId = jobClient.confId
+        self.aserver = aserver
+
+    async def list(self, allJobs=False):
+        jobs = await self.aserver.run(self.jobClient.list, allJobs)
+        return [AsyncJob(job, self.aserver) for job in jobs]
+
+    async def create(self, command, **args):
+        job = await self.aserver.run(self.jobClient.create, command, **args)
+        return AsyncJob(job, self.aserver)
+
+    async def inject(self, seed=None, urlDir=None, **args):
+        job = await self.aserver.run(self.jobClient.inject, seed, urlDir, **args)
+        return AsyncJob(job, self.aserver)
+
+    async def generate(self, **args):
+        return await self.create('GENERATE', **args)
+
+    async def fetch(self, **args):
+        return await self.create('FETCH', **args)
+
+    async def parse(self, **args):
+        return await self.create('PARSE', **args)
+
+    async def updatedb(self, **args):
+        return await self.create('UPDATEDB', **args)
+
+    async def stats(self):
+        return await self.aserver.run(self.jobClient.stats)
+
+
+class AsyncSeedClient(object):
+    """
+    Awaitable counterpart of SeedClient
+    """
+
+    def __init__(self, seedClient, aserver):
+        self.seedClient = seedClient
+        self.aserver = aserver
+
+    async def create(self, sid, seedList, seedFilter=None):
+        return await self.aserver.run(self.seedClient.create, sid, seedList, seedFilter)
+
+    async def createStream(self, sid, urls, chunkSize=DefaultSeedChunkSize, progress=None, seedFilter=None):
+        return await self.aserver.run(self.seedClient.createStream, sid, urls, chunkSize, progress, seedFilter)
+
+    async def createFromFile(self, sid, filename, chunkSize=None, progress=None, seedFilter=None):
+        return await self.aserver.run(self.seedClient.createFromFile, sid, filename, chunkSize, progress,
+                                      seedFilter)
+
+
+class AsyncCrawlClient(object):
+    """
+    Awaitable counterpart of CrawlClient
+
+    The crawl state machine is the one of the wrapped CrawlClient; only the REST calls run in the
+    request pool, and waiting between polls does not hold a thread.
+    """
+
+    def __init__(self, crawlClient, aserver):
+        self.crawlClient = crawlClient
+        self.aserver = aserver
+
+    @property
+    def currentJob(self):
+        job = self.crawlClient.currentJob
+        return AsyncJob(job, self.aserver) if job is not None else None
+
+    @property
+    def currentJobs(self):
+        return [AsyncJob(job, self.aserver) for job in self.crawlClient.currentJobs]
+
+    @property
+    def currentRound(self):
+        return self.crawlClient.currentRound
+
+    @property
+    def totalRounds(self):
+        return self.crawlClient.totalRounds
+
+    @property
+    def roundReports(self):
+        return self.crawlClient.roundReports
+
+    def addRounds(self, numRounds=1):
+        return self.crawlClient.addRounds(numRounds)
+
+    async def progress(self, nextRound=True):
+        """Awaitable CrawlClient.progress, returns the currently running AsyncJob or None"""
+        job = await self.aserver.run(self.crawlClient.progress, nextRound)
+        return AsyncJob(job, self.aserver) if job is not None else None
+
+    def addCallback(self, callback, eventTypes=None):
+        """
+        See CrawlClient.addCallback, callbacks run in the request pool
+        """
+        return self.crawlClient.addCallback(callback, eventTypes)
+
+    def removeCallback(self, callback):
+        self.crawlClient.removeCallback(callback)
+
+    async def events(self, nextRound=True):
+        """
+        Asynchronous generator counterpart of CrawlClient.events
+
+            async for event in cc.events():
+                ...
+        """
+        crawlClient = self.crawlClient
+        events = collections.deque()
+        crawlClient.addCallback(events.append)
+        try:
+            while True:
+                error = None
+                try:
+                    activeJob = await self.aserver.run(crawlClient.progress, nextRound)
+                except NutchCrawlException as e:
+                    error = e
+                while events:
+                    yield events.popleft()
+                if error is not None:
+                    raise error
+                if activeJob is None:
+                    return
+                await asyncio.sleep(crawlClient.pollDelay())
+        finally:
+            crawlClient.removeCallback(events.append)
+
+    async def nextRound(self):
+        """
+        Execute all jobs in the current round and return when they have finished.
+
+        :return: a list of all completed AsyncJobs
+        """
+
+        crawlClient = self.crawlClient
+        mark = await self.aserver.run(crawlClient._beginRounds)
+        if mark is None:
+            return []
+
+        while True:
+            try:
+                activeJob = await self.aserver.run(crawlClient.progress, False)
+            except NutchCrawlException as e:
+                e.completed_jobs = crawlClient.completedJobs[mark[0]:]
+                raise
+            if activeJob is None:
+                break
+            await asyncio.sleep(crawlClient.pollDelay())
+        jobs = await self.aserver.run(crawlClient._endRounds, mark)
+        return [AsyncJob(job, self.aserver) for job in jobs]
+
+    async def waitAll(self):
+        """
+        Execute all queued rounds and return when they have finished.
+
+        :return: a list of AsyncJobs completed for each round, organized by round (list-of-lists)
+        """
+
+        if self.crawlClient.maxOverlap:
+            return await self._waitPipelined()
+
+        finishedRounds = []
+        try:
+            while self.crawlClient._roundsLeft():
+                finishedRounds.append(await self.nextRound())
+        except NutchCrawlException as e:
+            e.completed_jobs = [job.job for jobs in finishedRounds for job in jobs] + e.completed_jobs
+            raise
+
+        return finishedRounds
+
+    async def _waitPipelined(self):
+        """Awaitable CrawlClient._waitPipelined"""
+
+        crawlClient = self.crawlClient
+        mark = await self.aserver.run(crawlClient._beginRounds)
+        if mark is None:
+            return []
+        try:
+            while await self.aserver.run(crawlClient.progress) is not None:
+                await asyncio.sleep(crawlClient.pollDelay())
+        except NutchCrawlException as e:
+            e.completed_jobs = crawlClient.completedJobs[mark[0]:]
+            raise
+        rounds = await self.aserver.run(crawlClient._endRounds, mark, True)
+        return [[AsyncJob(job, self.aserver) for job in jobs] for jobs in rounds]
+
+
+class AsyncNutch(object):
+    """
+    Awaitable counterpart of Nutch
+
+    Use ``await AsyncNutch.connect(...)`` to create one, or wrap an existing Nutch object.
+    """
+
+    def __init__(self, nutch, maxInFlight=DefaultMaxInFlight):
+        self.nutch = nutch
+        self.confId = nutch.confId
+        self.aserver = AsyncServer(nutch.server, maxInFlight)
+
+    @classmethod
+    async def connect(cls, confId=DefaultConfig, serverEndpoint=DefaultServerEndpoint, raiseErrors=True,
+                      server=None, maxInFlight=DefaultMaxInFlight, **args):
+        """
+        Create an AsyncNutch, taking the same arguments as Nutch plus maxInFlight
+        """
+        if server is None:
+            server = Server(serverEndpoint, raiseErrors, poolMaxSize=maxInFlight)
+        loop = asyncio.get_event_loop()
+        nutch = await loop.run_in_executor(None, functools.partial(Nutch, confId, server=server, **args))
+        return cls(nutch, maxInFlight)
+
+    def close(self):
+        self.aserver.close()
+
+    def Jobs(self, crawlId=None):
+        return AsyncJobClient(self.nutch.Jobs(crawlId), self.aserver)
+
+    def Config(self):
+        return AsyncConfig(self.nutch.Config(), self.aserver)
+
+    def Configs(self):
+        return AsyncConfigClient(self.nutch.Configs(), self.aserver)
+
+    def Seeds(self):
+        return AsyncSeedClient(self.nutch.Seeds(), self.aserver)
+
+    async def Crawl(self, seed, seedClient=None, jobClient=None, rounds=1, index=True, poller=None, polling=None,
+                    roundStats=False, pipeline=None, maxOverlap=0, checkpoint=None):
+        """
+        Launch a crawl using the given seed, see Nutch.Crawl
+
+        :return: an AsyncCrawlClient to monitor and control the crawl
+        """
+        if isinstance(seedClient, AsyncSeedClient):
+            seedClient = seedClient.seedClient
+        if isinstance(jobClient, AsyncJobClient):
+            jobClient = jobClient.jobClient
+        crawlClient = await self.aserver.run(self.nutch.Crawl, seed, seedClient, jobClient, rounds, index,
+                                             poller, polling, roundStats, pipeline, maxOverlap, checkpoint)
+        return AsyncCrawlClient(crawlClient, self.aserver)
+
+    async def ResumeCrawl(self, checkpoint, poller=None, polling=None, pipeline=None, roundStats=False):
+        """
+        Continue a crawl from its checkpoint, see Nutch.ResumeCrawl
+
+        :return: an AsyncCrawlClient to monitor and control the crawl
+        """
+        crawlClient = await self.aserver.run(self.nutch.ResumeCrawl, checkpoint, poller, polling, pipeline,
+                                             roundStats)
+        return AsyncCrawlClient(crawlClient, self.aserver)
+
+    async def getServerStatus(self):
+        return await self.aserver.run(self.nutch.getServerStatus)
+
+    async def stopServer(self):
+        return await self.aserver.run(self.nutch.stopServer)
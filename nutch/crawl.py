@@ -21,10 +21,31 @@ from __future__ import division
 
 import sys
 import argparse
+import xml.etree.ElementTree as ET
 import nutch
 
-#TODO: set this on when -verbose flag is requested in CLI args
-nutch.Verbose = False
+
+def parse_xml_conf(xml_file):
+    '''
+    Reads the properties of a nutch-site.xml style file, streaming it with iterparse.
+    Properties with an empty <value/> are read as ''.
+    :param xml_file: path to xml file
+    :return: dict of property name to value
+    '''
+
+    params = {}
+    name = value = None
+    for event, elem in ET.iterparse(xml_file):
+        if elem.tag == 'name':
+            name = (elem.text or '').strip()
+        elif elem.tag == 'value':
+            value = (elem.text or '').strip()
+        elif elem.tag == 'property':
+            if name:
+                params[name] = value if value is not None else ''
+            name = value = None
+            elem.clear()
+    return params
 
 
 class Crawler(object):
@@ -35,36 +56,60 @@ class Crawler(object):
         self.conf_id = args['conf_id'] if 'conf_id' in args else nutch.DefaultConfig
         self.proxy = nutch.Nutch(self.conf_id, self.server_url)
 
-    def crawl_cmd(self, seed_list, n):
+    def crawl_cmd(self, seed_list, n, seed_filter=None, chunk_size=None):
         '''
         Runs the crawl job for n rounds
-        :param seed_list: lines of seed URLs
+        :param seed_list: seed URLs, an iterable consumed lazily
         :param n: number of rounds
+        :param seed_filter: optional nutch.SeedFilter to normalize and deduplicate the seeds with
+        :param chunk_size: maximum number of URLs per uploaded seed list, by default nutch.DefaultSeedChunkSize
         :return: number of successful rounds
         '''
 
         print("Num Rounds "+str(n))
 
-        cc = self.proxy.Crawl(seed=seed_list, rounds=n)
+        # stream the seeds in chunks, so memory use does not depend on the size of the seed list
+        job_client = self.proxy.Jobs()
+        seeds = nutch.SeedClient(job_client.server).createStream(job_client.crawlId + '_seeds', seed_list,
+                                                                 chunk_size or nutch.DefaultSeedChunkSize,
+                                                                 seedFilter=seed_filter)
+        if seed_filter:
+            print("Dropped %d duplicate or blank seed URLs, kept %d" % (seed_filter.dropped, seed_filter.kept))
+        cc = self.proxy.Crawl(seed=seeds, jobClient=job_client, rounds=n)
         rounds = cc.waitAll()
         print("Completed %d rounds" % len(rounds))
         return len(rounds)
 
     def load_xml_conf(self, xml_file, id):
         '''
-        Creates a new config from xml file.
+        Creates or updates configs from xml file.
+        Existing configs only receive the properties that differ from the server's current values.
         :param xml_file: path to xml file. Format : nutch-site.xml or nutch-default.xml
-        :param id:
+        :param id: config id, or list of config ids to apply the same file to, one after the other
+        :return: config object, or list of config objects if a list of ids is given
+        '''
+
+        params = parse_xml_conf(xml_file)
+        if isinstance(id, (list, tuple)):
+            return [self.apply_conf(params, conf_id) for conf_id in id]
+        return self.apply_conf(params, id)
+
+    def apply_conf(self, params, id):
+        '''
+        Makes sure config id holds the given properties, uploading only what changed.
+        :param params: dict of properties
+        :param id: config id
         :return: config object
         '''
 
-        # converting nutch-site.xml to key:value pairs
-        import xml.etree.ElementTree as ET
-        tree = ET.parse(xml_file)
-        params = {}
-        for prop in tree.getroot().findall(".//property"):
-            params[prop.find('./name').text.strip()] = prop.find('./value').text.strip()
-        return self.proxy.Configs().create(id, configData=params)
+        configs = self.proxy.Configs()
+        try:
+            config = configs[id]
+        except (KeyError, nutch.NutchException):
+            return configs.create(id, configData=params)
+        changes = config.update(params)
+        print("Config %s: %d properties changed" % (id, len(changes)))
+        return config
 
 
     def create_cmd(self, args):
@@ -76,8 +121,8 @@ class Crawler(object):
         cmd = args.get('cmd_create')
         if cmd == 'conf':
             conf_file = args['conf_file']
-            conf_id = args['id']
-            return self.load_xml_conf(conf_file, conf_id)
+            conf_ids = args['id']
+            return self.load_xml_conf(conf_file, conf_ids[0] if len(conf_ids) == 1 else conf_ids)
         else:
             print("Error: Create %s is invalid or not implemented" % cmd)
 
@@ -93,13 +138,19 @@ def main(argv=sys.argv):
     conf_create_parser = create_subparsers.add_parser("conf", help="command for creating config")
 
     conf_create_parser.add_argument('-cf', '--conf-file', required=True, help='Path to conf file, nutch-site.xml')
-    conf_create_parser.add_argument('-id', '--id', required=True, help='Id for config')
+    conf_create_parser.add_argument('-id', '--id', required=True, nargs='+', help='Id(s) for config, updated one after the other')
 
     crawl_subseeds = crawl_parser.add_subparsers(help = "sub-commands of 'seed'", dest="cmd_crawl")
     crawl_subseeds.required = True
     subseeds_crawl_parser = crawl_subseeds.add_parser("seed", help="command for creating seeds")
     subseeds_crawl_parser.add_argument("-sf", "--seed-file", help="Seed file path (local path)")
     subseeds_crawl_parser.add_argument("-sl", "--seed-list", help="Comma separated set of seeds to crawl")
+    subseeds_crawl_parser.add_argument("-nz", "--normalize", action="store_true",
+                                       help="Normalize seed URLs (case, default port, fragment, trailing slash)")
+    subseeds_crawl_parser.add_argument("-dd", "--dedup", choices=["exact", "bloom"],
+                                       help="Drop duplicate seed URLs, exactly or with a fixed-size Bloom filter")
+    subseeds_crawl_parser.add_argument("-cs", "--chunk-size", type=int, default=nutch.DefaultSeedChunkSize,
+                                       help="Maximum number of URLs per uploaded seed list")
     
     crawl_parser.add_argument("-ci", "--conf-id", help="Config Identifier", required=True)
     crawl_parser.add_argument('-n', '--num-rounds', required=True, type=int, help='Number of rounds/iterations')
@@ -111,13 +162,17 @@ def main(argv=sys.argv):
     res = None
     crawler = Crawler(args)
     if args['cmd'] == 'crawl':
+        seed_filter = None
+        if args['normalize'] or args['dedup']:
+            seed_filter = nutch.SeedFilter(normalize=args['normalize'], dedup=args['dedup'])
         if args['seed_file'] != None:
             seed_file = args['seed_file']
-            with open(seed_file) as rdr:
-                res = crawler.crawl_cmd(rdr.readlines(), args['num_rounds'])
+            res = crawler.crawl_cmd(nutch.iterSeedFile(seed_file), args['num_rounds'], seed_filter,
+                                    args['chunk_size'])
         elif args['seed_list'] != None:
                 seed_list = args['seed_list']
-                res = crawler.crawl_cmd(str(seed_list).rsplit(','), args['num_rounds'])
+                res = crawler.crawl_cmd(str(seed_list).rsplit(','), args['num_rounds'], seed_filter,
+                                        args['chunk_size'])
     elif args['cmd'] == 'create':
         res = crawler.create_cmd(args)
     else:
@@ -0,0 +1,352 @@
+# encoding: utf-8
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+In-process stand-in for the Nutch REST server (Python 3 only).
+
+MockNutchServer answers the endpoints used by this client (/admin, /config, /job, /job/create,
+/job/<id>/stop|abort, /seed/create and /db/crawldb) from memory, so the client can be tested and
+load-tested without Nutch or Hadoop:
+
+    with MockNutchServer(durations={'FETCH': 2}, failureRate=0.01) as mock:
+        nt = Nutch(serverEndpoint=mock.endpoint)
+        nt.Crawl(['http://nutch.apache.org/']).waitAll()
+
+Jobs do nothing: a job stays IDLE for queueDelay seconds, is RUNNING for the duration of its type, and then
+FINISHED (or FAILED, with probability failureRate).  The crawldb statistics follow a simple model: INJECT adds
+the URLs of its seed list, and each UPDATEDB marks every unfetched URL as fetched and discovers linksPerPage
+new URLs per fetched page.
+
+It can also be run on its own, e.g. in place of a Nutch server on the default port:
+
+    python -m nutch.mockserver --port 8081
+"""
+
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import glob
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+from time import sleep, time
+
+from .nutch import DefaultConfig, DefaultPort, DefaultUserAgent
+
+DefaultJobDuration = 0.05
+DefaultMockParameters = {
+    'http.agent.name': DefaultUserAgent,
+    'db.fetch.interval.default': '2592000',
+    'db.fetch.interval.max': '7776000',
+    'fetcher.threads.fetch': '10',
+    'generate.max.count': '-1',
+}
+
+JsonType = 'application/json'
+TextType = 'text/plain'
+
+
+class MockNutchServer(object):
+    """
+    A fake Nutch REST server running in a background thread
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, durations=None, defaultDuration=DefaultJobDuration, queueDelay=0,
+                 latency=0, failureRate=0, errorRate=0, linksPerPage=2, seedDir=None, randomSeed=None):
+        """
+        :param host: the address to listen on
+        :param port: the port to listen on, 0 picks a free one (see endpoint)
+        :param durations: seconds that jobs of each type run, e.g. {'FETCH': 2, 'PARSE': 1}
+        :param defaultDuration: seconds that jobs of other types run
+        :param queueDelay: seconds that jobs stay IDLE before running
+        :param latency: seconds added to the handling of every request
+        :param failureRate: probability that a job ends FAILED
+        :param errorRate: probability that a request is answered with a 503 error
+        :param linksPerPage: URLs discovered per fetched page by UPDATEDB, for the crawldb statistics
+        :param seedDir: directory where seed lists are written, by default a temporary directory removed by stop()
+        :param randomSeed: seed of the random failures, for reproducible runs
+        """
+        self.durations = dict(durations) if durations else {}
+        self.defaultDuration = defaultDuration
+        self.queueDelay = queueDelay
+        self.latency = latency
+        self.failureRate = failureRate
+        self.errorRate = errorRate
+        self.linksPerPage = linksPerPage
+        self._ownSeedDir = seedDir is None
+        self.seedDir = tempfile.mkdtemp(prefix='nutch-mock-') if seedDir is None else seedDir
+        self.random = random.Random(randomSeed)
+        self.configs = {DefaultConfig: dict(DefaultMockParameters)}
+        self.jobs = {}
+        self.requestCount = 0
+        self.started = time()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), MockRequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self._thread = None
+
+    @property
+    def endpoint(self):
+        """The URL of the server, to pass to Nutch or Server"""
+        host, port = self._httpd.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+    def start(self):
+        """
+        Serve requests in a daemon thread
+
+        :return: this MockNutchServer
+        """
+        self._thread = threading.Thread(target=self._httpd.serve_forever, args=(0.05,), name='MockNutchServer')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving, and remove the seed directory if it was created by this server"""
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+        if self._ownSeedDir:
+            shutil.rmtree(self.seedDir, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    ## request handling
+
+    def handle(self, verb, path, body):
+        """
+        Answer one request
+
+        :param verb: the HTTP method, lower-cased
+        :param path: the request path, without query string
+        :param body: the request body, as text
+        :return: a tuple (status, content type, body)
+        """
+        with self._lock:
+            self.requestCount += 1
+            error = self.random.random() < self.errorRate
+        if self.latency:
+            sleep(self.latency)
+        if error:
+            return 503, TextType, 'Simulated server error'
+
+        parts = path.strip('/').split('/')
+        try:
+            with self._lock:
+                if parts[0] == 'admin':
+                    return self._admin(verb, parts)
+                if parts[0] == 'config':
+                    return self._config(verb, parts, body)
+                if parts[0] == 'job':
+                    return self._job(verb, parts, body)
+                if parts == ['seed', 'create'] and verb == 'post':
+                    return self._seed(json.loads(body))
+                if parts == ['db', 'crawldb'] and verb == 'post':
+                    return 200, JsonType, self._stats(json.loads(body)['crawlId'])
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, TextType, 'Bad request: %s' % e
+        return 404, TextType, 'Not found: %s %s' % (verb.upper(), path)
+
+    def _admin(self, verb, parts):
+        if parts == ['admin'] and verb == 'get':
+            now = time()
+            running = [self._info(job, now) for job in self.jobs.values()
+                       if self._state(job, now) in ('IDLE', 'RUNNING')]
+            return 200, JsonType, {'startDate': int(self.started * 1000), 'configuration': sorted(self.configs),
+                                   'jobs': {'totalJobs': len(self.jobs), 'runningJobs': len(running)},
+                                   'runningJobs': running}
+        if parts == ['admin', 'stop'] and verb == 'post':
+            return 200, TextType, 'Stopping in server on port %d' % self._httpd.server_address[1]
+        return 404, TextType, 'Not found'
+
+    def _config(self, verb, parts, body):
+        if len(parts) == 1 and verb == 'get':
+            return 200, JsonType, sorted(self.configs)
+        if parts[1:] == ['create'] and verb == 'post':
+            data = json.loads(body)
+            cid = data['configId']
+            if cid in self.configs and not data.get('force'):
+                return 400, TextType, 'Config %s already exists' % cid
+            # like Nutch, new configurations start from the default one
+            params = dict(self.configs[DefaultConfig])
+            params.update(data.get('params') or {})
+            self.configs[cid] = params
+            return 200, TextType, cid
+
+        params = self.configs.get(parts[1])
+        if len(parts) == 2:
+            if verb == 'get':
+                return 200, JsonType, dict(params) if params is not None else {}
+            if verb == 'delete':
+                self.configs.pop(parts[1], None)
+                return 200, TextType, ''
+        elif len(parts) == 3 and params is not None:
+            if verb == 'get' and parts[2] in params:
+                return 200, TextType, params[parts[2]]
+            if verb == 'put':
+                params[parts[2]] = body
+                return 200, TextType, ''
+        return 404, TextType, 'Not found'
+
+    def _job(self, verb, parts, body):
+        now = time()
+        if len(parts) == 1 and verb == 'get':
+            return 200, JsonType, [self._info(job, now) for job in self.jobs.values()]
+        if parts[1:] == ['create'] and verb == 'post':
+            return 200, JsonType, self._info(self._create(json.loads(body), now), now)
+
+        job = self.jobs.get(parts[1])
+        if job is None:
+            return 404, TextType, 'Unknown job %s' % parts[1]
+        if len(parts) == 2 and verb == 'get':
+            return 200, JsonType, self._info(job, now)
+        if len(parts) == 3 and parts[2] in ('stop', 'abort') and verb == 'get':
+            active = self._state(job, now) in ('IDLE', 'RUNNING')
+            if active:
+                job['override'] = 'STOPPING' if parts[2] == 'stop' else 'KILLED'
+            return 200, JsonType, active
+        return 404, TextType, 'Not found'
+
+    def _seed(self, data):
+        seedPath = tempfile.mkdtemp(prefix=data['name'] + '-', dir=self.seedDir)
+        with open(os.path.join(seedPath, 'seed.txt'), 'w') as f:
+            for seedUrl in data['seedUrls']:
+                f.write(seedUrl['url'] + '\n')
+        return 200, TextType, seedPath
+
+    ## simulated jobs
+
+    def _create(self, data, now):
+        jobType = data['type'].upper()
+        crawlId = data.get('crawlId')
+        jid = '%s-%s-%d' % (crawlId, jobType, len(self.jobs))
+        started = now + self.queueDelay
+        job = {
+            'id': jid, 'type': jobType, 'confId': data.get('confId'), 'args': data.get('args') or {},
+            'crawlId': crawlId, 'created': now, 'started': started,
+            'finished': started + self.durations.get(jobType, self.defaultDuration),
+            'fails': self.random.random() < self.failureRate, 'override': None,
+        }
+        self.jobs[jid] = job
+        return job
+
+    def _state(self, job, now):
+        if job['override']:
+            return job['override']
+        if now < job['started']:
+            return 'IDLE'
+        if now < job['finished']:
+            return 'RUNNING'
+        return 'FAILED' if job['fails'] else 'FINISHED'
+
+    def _info(self, job, now):
+        state = self._state(job, now)
+        return {'id': job['id'], 'type': job['type'], 'confId': job['confId'], 'args': job['args'],
+                'crawlId': job['crawlId'], 'state': state, 'result': None,
+                'msg': 'ERROR: simulated failure' if state == 'FAILED' else 'OK'}
+
+    def _stats(self, crawlId):
+        now = time()
+        unfetched = fetched = 0
+        for job in self.jobs.values():
+            if job['crawlId'] != crawlId or self._state(job, now) != 'FINISHED':
+                continue
+            if job['type'] == 'INJECT':
+                unfetched += self._seedCount(job['args'].get('url_dir'))
+            elif job['type'] == 'UPDATEDB':
+                fetched += unfetched
+                unfetched *= self.linksPerPage
+        return {'totalUrls': unfetched + fetched, 'minScore': 0.0, 'maxScore': 1.0, 'avgScore': 0.5,
+                'status': {'1': {'statusValue': 'db_unfetched', 'count': unfetched},
+                           '2': {'statusValue': 'db_fetched', 'count': fetched}}}
+
+    def _seedCount(self, seedPath):
+        count = 0
+        for filename in glob.glob(os.path.join(seedPath or '', '*.txt')):
+            with open(filename) as f:
+                count += sum(1 for line in f if line.strip())
+        return count
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    """Hands every request to the MockNutchServer of the HTTP server"""
+
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, don't let Nagle's algorithm delay the body
+    disable_nagle_algorithm = True
+
+    def _respond(self, verb):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8') if length else ''
+        status, contentType, content = self.server.mock.handle(verb, self.path.split('?')[0], body)
+        if contentType == JsonType:
+            content = json.dumps(content)
+        payload = content.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', contentType)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._respond('get')
+
+    def do_POST(self):
+        self._respond('post')
+
+    def do_PUT(self):
+        self._respond('put')
+
+    def do_DELETE(self):
+        self._respond('delete')
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock Nutch REST server")
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=int(DefaultPort), help='Port to listen on')
+    parser.add_argument('--duration', type=float, default=DefaultJobDuration, help='Seconds each job runs')
+    parser.add_argument('--latency', type=float, default=0, help='Seconds added to every request')
+    parser.add_argument('--failure-rate', type=float, default=0, help='Probability that a job fails')
+    parser.add_argument('--error-rate', type=float, default=0, help='Probability that a request gets a 503')
+    args = parser.parse_args(argv)
+
+    mock = MockNutchServer(args.host, args.port, defaultDuration=args.duration, latency=args.latency,
+                           failureRate=args.failure_rate, errorRate=args.error_rate).start()
+    print("Mock Nutch server listening on %s" % mock.endpoint)
+    try:
+        mock._thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.stop()
+
+
+if __name__ == '__main__':
+    main()
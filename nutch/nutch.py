@@ -38,22 +38,75 @@ To see the status of jobs, use:
 
 """
 
+from bisect import bisect, bisect_left
+import bz2
 import collections
+import cProfile
+import csv
 from datetime import datetime
 import getopt
 from getpass import getuser
+import gzip
+import hashlib
+import io
+import itertools
+from itertools import islice
+import json
+import logging
+import math
+import os
+import pstats
+import random
 import requests
+from requests.adapters import HTTPAdapter
+import shutil
 import sys
-from time import sleep
+import tempfile
+import threading
+from time import sleep, time
+import uuid
+
+try:
+    from urllib.parse import urlsplit, urlunsplit
+except ImportError:
+    from urlparse import urlsplit, urlunsplit
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+# os.rename does not replace an existing file on Windows, and os.replace is Python 3 only
+replace = getattr(os, 'replace', os.rename)
 
 DefaultServerHost = "localhost"
 DefaultPort = "8081"
 DefaultServerEndpoint = 'http://' + DefaultServerHost + ':' + DefaultPort
 DefaultConfig = 'default'
 DefaultUserAgent = 'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)'
+DefaultPoolConnections = 10
+DefaultPoolMaxSize = 10
+DefaultPollInterval = 1
+DefaultConnectTimeout = 10
+DefaultReadTimeout = 120
+DefaultHealthInterval = 30
+DefaultSeedChunkSize = 100000
+DefaultConfigTTL = 60
+DefaultConfigBulkThreshold = 5
+DefaultConfigWorkers = 8
+DefaultMaxLogBody = 1024
+
+LatencyBuckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+JobDurationBuckets = (1, 5, 15, 30, 60, 300, 900, 1800, 3600, 7200, 14400, 43200)
 
 LegalJobs = ['INJECT', 'GENERATE', 'FETCH', 'PARSE', 'UPDATEDB',
              'CRAWL', 'DEDUP', 'INVERTLINKS', 'INDEX']
+RoundJobs = ['GENERATE', 'FETCH', 'PARSE', 'UPDATEDB', 'INVERTLINKS', 'DEDUP']
 RequestVerbs = {'get': requests.get, 'put': requests.put, 'post': requests.post, 'delete': requests.delete}
 
 TextSendHeader = {'Content-Type': 'text/plain'}
@@ -70,16 +123,24 @@ class NutchCrawlException(NutchException):
     completed_jobs = []
 
 
-# TODO: Replace with Python logger
-Verbose = True
+class NutchCircuitOpenException(NutchException):
+    """Raised without contacting the server while its CircuitBreaker is open"""
+    pass
+
+
+log = logging.getLogger('nutch')
 
 
 def echo2(*s):
     sys.stderr.write('nutch.py: ' + ' '.join(map(str, s)) + '\n')
 
 
-def warn(*s):
-    echo2('Warn:', *s)
+def abbreviate(value, limit):
+    """Return str(value), cut to at most limit characters"""
+    text = str(value)
+    if len(text) <= limit:
+        return text
+    return '%s... (%d more characters)' % (text[:limit], len(text) - limit)
 
 
 def die(*s):
@@ -98,23 +159,552 @@ def defaultCrawlId():
     return '_'.join(('crawl', user, timestamp))
 
 
+def endpointOf(servicePath):
+    """
+    :return: the REST endpoint of servicePath, with ids replaced by placeholders, e.g. '/job/{id}/stop'
+    """
+    parts = servicePath.strip('/').split('/')
+    if parts[0] in ('job', 'config') and len(parts) > 1 and parts[1] != 'create':
+        parts[1] = '{id}'
+        if parts[0] == 'config' and len(parts) > 2:
+            parts[2] = '{param}'
+    return '/' + '/'.join(parts)
+
+
+class Histogram(object):
+    """
+    Counts of observed values per bucket, with their sum, as in Prometheus histograms
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        """:return: {'buckets': [(upper bound, cumulative count), ...], 'sum': ..., 'count': ...}"""
+        cumulative = 0
+        buckets = []
+        for bound, count in zip(list(self.buckets) + [float('inf')], self.counts):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        return {'buckets': buckets, 'sum': self.sum, 'count': self.count}
+
+
+class ClientMetrics(object):
+    """
+    Thread-safe counters describing the traffic of a Server and the jobs it ran
+
+    Requests are counted per verb and endpoint (see endpointOf): number of requests, errors by HTTP status
+    or exception name, bytes sent and received, and a latency histogram.  Jobs are counted per type and final
+    state, with a histogram of their durations as seen by CrawlClient.
+    """
+
+    def __init__(self, latencyBuckets=LatencyBuckets, jobBuckets=JobDurationBuckets):
+        self.latencyBuckets = latencyBuckets
+        self.jobBuckets = jobBuckets
+        self._requests = {}
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def observeRequest(self, verb, endpoint, latency, status=None, error=None, bytesOut=0, bytesIn=0):
+        """
+        Record one request: status is the HTTP status of the response, error the exception name if none was received
+        """
+        with self._lock:
+            stats = self._requests.get((verb, endpoint))
+            if stats is None:
+                stats = self._requests[(verb, endpoint)] = {
+                    'count': 0, 'errors': {}, 'bytesOut': 0, 'bytesIn': 0, 'latency': Histogram(self.latencyBuckets)}
+            stats['count'] += 1
+            if error or status != 200:
+                key = error if error else str(status)
+                stats['errors'][key] = stats['errors'].get(key, 0) + 1
+            stats['bytesOut'] += bytesOut
+            stats['bytesIn'] += bytesIn
+            stats['latency'].observe(latency)
+
+    def observeJob(self, jobType, state, duration):
+        """Record a job of jobType that ended in state after duration seconds"""
+        with self._lock:
+            stats = self._jobs.get(jobType)
+            if stats is None:
+                stats = self._jobs[jobType] = {'states': {}, 'duration': Histogram(self.jobBuckets)}
+            stats['states'][state] = stats['states'].get(state, 0) + 1
+            stats['duration'].observe(duration)
+
+    def snapshot(self):
+        """
+        :return: a copy of all counters, as {'requests': {'GET /job/{id}': {...}, ...}, 'jobs': {'FETCH': {...}, ...}}
+        """
+        with self._lock:
+            requests = {}
+            for (verb, endpoint), stats in self._requests.items():
+                requests['%s %s' % (verb.upper(), endpoint)] = {
+                    'verb': verb, 'endpoint': endpoint, 'count': stats['count'], 'errors': dict(stats['errors']),
+                    'bytesOut': stats['bytesOut'], 'bytesIn': stats['bytesIn'],
+                    'latency': stats['latency'].snapshot()}
+            jobs = {}
+            for jobType, stats in self._jobs.items():
+                jobs[jobType] = {'states': dict(stats['states']), 'duration': stats['duration'].snapshot()}
+        return {'requests': requests, 'jobs': jobs}
+
+    def prometheus(self, prefix='nutch_client'):
+        """
+        :return: all counters in the Prometheus text exposition format
+        """
+
+        def labels(**values):
+            return '{%s}' % ','.join('%s="%s"' % (key, values[key]) for key in sorted(values))
+
+        def histogram(name, snapshot, **values):
+            for bound, count in snapshot['buckets']:
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('%s_bucket%s %d' % (name, labels(le=le, **values), count))
+            lines.append('%s_sum%s %r' % (name, labels(**values), snapshot['sum']))
+            lines.append('%s_count%s %d' % (name, labels(**values), snapshot['count']))
+
+        snapshot = self.snapshot()
+        requests = sorted(snapshot['requests'].values(), key=lambda stats: (stats['endpoint'], stats['verb']))
+        lines = []
+        lines.append('# TYPE %s_requests_total counter' % prefix)
+        for stats in requests:
+            lines.append('%s_requests_total%s %d' % (prefix, labels(verb=stats['verb'], endpoint=stats['endpoint']),
+                                                     stats['count']))
+        lines.append('# TYPE %s_request_errors_total counter' % prefix)
+        for stats in requests:
+            for error, count in sorted(stats['errors'].items()):
+                lines.append('%s_request_errors_total%s %d' % (
+                    prefix, labels(verb=stats['verb'], endpoint=stats['endpoint'], error=error), count))
+        for direction in ('Out', 'In'):
+            name = '%s_request_bytes_%s_total' % (prefix, 'sent' if direction == 'Out' else 'received')
+            lines.append('# TYPE %s counter' % name)
+            for stats in requests:
+                lines.append('%s%s %d' % (name, labels(verb=stats['verb'], endpoint=stats['endpoint']),
+                                          stats['bytes' + direction]))
+        lines.append('# TYPE %s_request_duration_seconds histogram' % prefix)
+        for stats in requests:
+            histogram(prefix + '_request_duration_seconds', stats['latency'], verb=stats['verb'],
+                      endpoint=stats['endpoint'])
+        lines.append('# TYPE %s_jobs_total counter' % prefix)
+        for jobType, stats in sorted(snapshot['jobs'].items()):
+            for state, count in sorted(stats['states'].items()):
+                lines.append('%s_jobs_total%s %d' % (prefix, labels(type=jobType, state=state), count))
+        lines.append('# TYPE %s_job_duration_seconds histogram' % prefix)
+        for jobType, stats in sorted(snapshot['jobs'].items()):
+            histogram(prefix + '_job_duration_seconds', stats['duration'], type=jobType)
+        return '\n'.join(lines) + '\n'
+
+
+class RetryPolicy(object):
+    """
+    Decide which failed requests are retried, and how long to wait before retrying
+
+    Connection errors, timeouts and responses with one of statusCodes are retried up to retries times,
+    waiting backoff * 2**attempt seconds (or the server's Retry-After), capped at maxBackoff and
+    randomized by +/- jitter.  Only the verbs listed in verbs are retried, by default the idempotent ones.
+    """
+
+    def __init__(self, retries=3, backoff=0.5, maxBackoff=30, jitter=0.1,
+                 statusCodes=(500, 502, 503, 504), verbs=('get', 'put', 'delete')):
+        self.retries = retries
+        self.backoff = backoff
+        self.maxBackoff = maxBackoff
+        self.jitter = jitter
+        self.statusCodes = statusCodes
+        self.verbs = verbs
+
+    def maxRetries(self, verb):
+        """:return: the number of times a request with this verb may be retried"""
+        return self.retries if verb in self.verbs else 0
+
+    def delay(self, attempt, resp=None):
+        """
+        :param attempt: number of retries already made for this request
+        :param resp: the failed response, if any
+        :return: seconds to wait before the next attempt
+        """
+        delay = self.backoff * 2 ** attempt
+        retryAfter = resp.headers.get('retry-after') if resp is not None else None
+        if retryAfter and retryAfter.isdigit():
+            delay = int(retryAfter)
+        delay = min(self.maxBackoff, delay)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+class CircuitBreaker(object):
+    """
+    Fail fast while a server is down
+
+    After failureThreshold consecutive failures (connection errors, timeouts, broken responses or 5xx responses) the
+    circuit opens and requests raise NutchCircuitOpenException without reaching the server.
+    After resetTimeout seconds a single probe request is let through: the circuit closes if it succeeds,
+    and opens again otherwise.
+    """
+
+    CLOSED = 'CLOSED'
+    OPEN = 'OPEN'
+    HALF_OPEN = 'HALF_OPEN'
+
+    def __init__(self, failureThreshold=5, resetTimeout=30):
+        self.failureThreshold = failureThreshold
+        self.resetTimeout = resetTimeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._openedAt = 0
+        self._lock = threading.Lock()
+
+    def before(self):
+        """Raise NutchCircuitOpenException if a request may not be sent now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time() - self._openedAt >= self.resetTimeout:
+                self.state = self.HALF_OPEN
+                return
+        raise NutchCircuitOpenException("Circuit open after %d failures, not calling the server" % self.failures)
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = self.CLOSED
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failureThreshold:
+                self.state = self.OPEN
+                self._openedAt = time()
+
+
+class ServerRequest(object):
+    """
+    One call of Server.call, as seen by middlewares
+
+    beforeRequest hooks may change verb, servicePath, data, headers and timeout before the request is sent.
+    response is the requests.Response once it is received, and context is a dict where middlewares keep
+    their per-call state.
+    """
+
+    def __init__(self, verb, servicePath, data, headers, timeout, sendJson):
+        self.verb = verb
+        self.servicePath = servicePath
+        self.data = data
+        self.headers = headers
+        self.timeout = timeout
+        self.sendJson = sendJson
+        self.started = time()
+        self.response = None
+        self.context = {}
+
+    @property
+    def endpoint(self):
+        return endpointOf(self.servicePath)
+
+    def elapsed(self):
+        """:return: seconds since the call started"""
+        return time() - self.started
+
+
+class Middleware(object):
+    """
+    Hooks run around every Server.call, see Server.use
+
+    beforeRequest hooks run in the order the middlewares were added; afterResponse and onError hooks run in
+    the reverse order.  afterResponse receives the requests.Response once retries are over, whatever its
+    status; onError receives any exception raised by the call, including the NutchException of a non-200
+    response, and is run for every middleware even if a beforeRequest hook failed.  Subclasses override
+    the hooks they need.
+    """
+
+    def beforeRequest(self, request):
+        pass
+
+    def afterResponse(self, request, response):
+        pass
+
+    def onError(self, request, error):
+        pass
+
+
+class TimingMiddleware(Middleware):
+    """
+    Count calls and their wall-clock time (including retries) per verb and endpoint
+
+    Unlike ClientMetrics, which records every attempt, one call is one observation here.
+    """
+
+    def __init__(self):
+        self._timings = {}
+        self._lock = threading.Lock()
+
+    def _observe(self, request, failed):
+        elapsed = request.elapsed()
+        key = '%s %s' % (request.verb.upper(), request.endpoint)
+        with self._lock:
+            timing = self._timings.setdefault(key, {'count': 0, 'errors': 0, 'total': 0.0, 'max': 0.0})
+            timing['count'] += 1
+            timing['errors'] += 1 if failed else 0
+            timing['total'] += elapsed
+            timing['max'] = max(timing['max'], elapsed)
+
+    def afterResponse(self, request, response):
+        self._observe(request, response.status_code != 200)
+
+    def onError(self, request, error):
+        if request.response is None:
+            self._observe(request, True)
+
+    def timings(self):
+        """
+        :return: {'GET /job/{id}': {'count': ..., 'errors': ..., 'total': ..., 'max': ..., 'mean': ...}, ...}
+        """
+        with self._lock:
+            return dict((key, dict(timing, mean=timing['total'] / timing['count']))
+                        for key, timing in self._timings.items())
+
+
+class SlowCallMiddleware(Middleware):
+    """
+    Log the calls that take longer than threshold seconds
+    """
+
+    def __init__(self, threshold=1.0, logger=None, level=logging.WARNING):
+        self.threshold = threshold
+        self.logger = logger if logger else log
+        self.level = level
+
+    def afterResponse(self, request, response):
+        elapsed = request.elapsed()
+        if elapsed >= self.threshold:
+            self.logger.log(self.level, 'Slow call: %s %s took %.3fs (status %d)', request.verb.upper(),
+                            request.servicePath, elapsed, response.status_code)
+
+    def onError(self, request, error):
+        elapsed = request.elapsed()
+        if request.response is None and elapsed >= self.threshold:
+            self.logger.log(self.level, 'Slow call: %s %s failed after %.3fs: %s', request.verb.upper(),
+                            request.servicePath, elapsed, error)
+
+
+class ProfilingMiddleware(Middleware):
+    """
+    Run cProfile over a random sample of calls, and accumulate the results
+
+    Only one call is profiled at a time; calls made while another one is profiled are not sampled.
+    Note that a call is profiled from beforeRequest to afterResponse, so other middlewares and the parsing
+    of the response are not included.
+    """
+
+    def __init__(self, sampleRate=0.01):
+        """
+        :param sampleRate: the fraction of calls to profile
+        """
+        self.sampleRate = sampleRate
+        self.sampled = 0
+        self._stats = None
+        self._lock = threading.Lock()
+        self._busy = threading.Lock()
+
+    def beforeRequest(self, request):
+        if random.random() >= self.sampleRate or not self._busy.acquire(False):
+            return
+        profiler = cProfile.Profile()
+        request.context['profiler'] = profiler
+        profiler.enable()
+
+    def _collect(self, request):
+        profiler = request.context.pop('profiler', None)
+        if profiler is None:
+            return
+        profiler.disable()
+        self._busy.release()
+        with self._lock:
+            self.sampled += 1
+            if self._stats is None:
+                self._stats = pstats.Stats(profiler)
+            else:
+                self._stats.add(profiler)
+
+    def afterResponse(self, request, response):
+        self._collect(request)
+
+    def onError(self, request, error):
+        self._collect(request)
+
+    def stats(self):
+        """:return: the accumulated pstats.Stats, or None if no call was sampled yet"""
+        return self._stats
+
+    def printStats(self, sortBy='cumulative', limit=20, stream=None):
+        """Print the limit most expensive functions of the sampled calls"""
+        with self._lock:
+            if self._stats is None:
+                return
+            self._stats.stream = stream if stream else sys.stdout
+            self._stats.sort_stats(sortBy).print_stats(limit)
+
+
+class TraceIdMiddleware(Middleware):
+    """
+    Tag every call with a trace id header, so client and server logs can be correlated
+
+    The id is kept in request.context['traceId'].  A header already set by the caller is kept.
+    """
+
+    def __init__(self, header='X-Request-ID', generate=None):
+        """
+        :param header: the name of the header
+        :param generate: a function returning a new trace id, by default a random UUID
+        """
+        self.header = header
+        self.generate = generate if generate else lambda: uuid.uuid4().hex
+
+    def beforeRequest(self, request):
+        traceId = request.headers.setdefault(self.header, self.generate())
+        request.context['traceId'] = traceId
+
+
 class Server:
     """
     Implements basic interactions with a Nutch RESTful Server
+
+    Requests are sent over a pool of keep-alive connections owned by this Server, so every client
+    built on top of it (JobClient, ConfigClient, SeedClient, CrawlClient) reuses the same TCP connections.
+    A Server may be shared between threads: each thread gets its own requests.Session, and all sessions
+    are mounted on the same connection pool.
     """
 
-    def __init__(self, serverEndpoint, raiseErrors=True):
+    def __init__(self, serverEndpoint, raiseErrors=True, poolConnections=DefaultPoolConnections,
+                 poolMaxSize=DefaultPoolMaxSize, poolBlock=False, retryPolicy=None, circuitBreaker=None,
+                 timeout=(DefaultConnectTimeout, DefaultReadTimeout), logger=None, maxLogBody=DefaultMaxLogBody,
+                 clientMetrics=None, middlewares=None):
         """
         Create a Server object for low-level interactions with a Nutch RESTful Server
 
         :param serverEndpoint: URL of the server
         :param raiseErrors: Raise an exception for non-200 status codes
+        :param poolConnections: number of per-host connection pools to cache
+        :param poolMaxSize: maximum number of keep-alive connections kept open to a single host
+        :param poolBlock: block when all poolMaxSize connections to a host are busy, instead of
+         opening (and then discarding) an extra connection
+        :param retryPolicy: RetryPolicy for failed requests, by default a RetryPolicy(); RetryPolicy(0) disables retries
+        :param circuitBreaker: CircuitBreaker guarding the server, by default a CircuitBreaker()
+        :param timeout: (connect, read) timeouts in seconds, or a single timeout for both, None to wait forever
+        :param logger: the logging.Logger of this Server, by default the 'nutch' logger.  Requests and responses
+         are logged at DEBUG level, and nothing is formatted unless that level is enabled.
+        :param maxLogBody: the number of characters of request and response bodies to log
+        :param clientMetrics: the ClientMetrics recording the traffic of this Server, which may be shared between
+         Servers; by default a new one.  See metrics().
+        :param middlewares: Middlewares run around every call, see use()
 
         """
         self.serverEndpoint = serverEndpoint
         self.raiseErrors = raiseErrors
+        self.retryPolicy = retryPolicy if retryPolicy else RetryPolicy()
+        self.circuitBreaker = circuitBreaker if circuitBreaker else CircuitBreaker()
+        self.timeout = timeout
+        self.logger = logger if logger else log
+        self.maxLogBody = maxLogBody
+        self.clientMetrics = clientMetrics if clientMetrics else ClientMetrics()
+        self.middlewares = list(middlewares) if middlewares else []
+        self.adapter = HTTPAdapter(pool_connections=poolConnections, pool_maxsize=poolMaxSize,
+                                   pool_block=poolBlock)
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def session(self):
+        """
+        Return the requests.Session used by the calling thread, creating it on first use.
+
+        All sessions of this Server share one connection pool.
+        """
+
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('http://', self.adapter)
+            session.mount('https://', self.adapter)
+            self._local.session = session
+        return session
+
+    def close(self):
+        """Close all pooled connections to the server"""
+        self.adapter.close()
+
+    def use(self, *middlewares):
+        """
+        Add Middlewares to run around every call of this Server, see Middleware
 
-    def call(self, verb, servicePath, data=None, headers=None, forceText=False, sendJson=True):
+        :return: this Server
+        """
+        self.middlewares.extend(middlewares)
+        return self
+
+    def serverFor(self, key):
+        """
+        Return the Server that handles the jobs and seeds of a crawl, see ServerPool.  A Server handles everything.
+        """
+        return self
+
+    def metrics(self):
+        """
+        :return: a snapshot of the request and job counters of this Server, see ClientMetrics.snapshot
+        """
+        return self.clientMetrics.snapshot()
+
+    def _send(self, verb, url, endpoint, timeout, **kwargs):
+        """Send a request through the circuit breaker, retrying as allowed by the retry policy"""
+
+        maxRetries = self.retryPolicy.maxRetries(verb)
+        attempt = 0
+        while True:
+            self.circuitBreaker.before()
+            started = time()
+            try:
+                resp = self.session().request(verb, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.clientMetrics.observeRequest(verb, endpoint, time() - started, error=type(e).__name__)
+                self.circuitBreaker.failure()
+                if attempt >= maxRetries:
+                    raise
+                self.logger.warning('Request failed, retrying: %s %s %s', verb.upper(), url, e)
+                sleep(self.retryPolicy.delay(attempt))
+                attempt += 1
+                continue
+            except Exception as e:
+                # e.g. ChunkedEncodingError when the server dies mid-response: not retried, but a failure all the
+                # same, and a half-open probe must always close or reopen the circuit
+                self.clientMetrics.observeRequest(verb, endpoint, time() - started, error=type(e).__name__)
+                self.circuitBreaker.failure()
+                raise
+
+            request = resp.request
+            self.clientMetrics.observeRequest(verb, endpoint, time() - started, resp.status_code,
+                                              bytesOut=len(request.body or b'') if request is not None else 0,
+                                              bytesIn=len(resp.content))
+            if resp.status_code >= 500:
+                self.circuitBreaker.failure()
+            else:
+                self.circuitBreaker.success()
+            if resp.status_code not in self.retryPolicy.statusCodes or attempt >= maxRetries:
+                return resp
+            self.logger.warning('Nutch server returned status %d, retrying: %s %s', resp.status_code, verb.upper(), url)
+            sleep(self.retryPolicy.delay(attempt, resp))
+            attempt += 1
+
+    def call(self, verb, servicePath, data=None, headers=None, forceText=False, sendJson=True, timeout=None):
         """Call the Nutch Server, do some error checking, and return the response.
 
         :param verb: One of nutch.RequestVerbs
@@ -123,48 +713,68 @@ class Server:
         :param headers: headers to attach to this request, default are JsonAcceptHeader
         :param forceText: don't trust the response headers and just get the text
         :param sendJson: Whether to treat attached data as JSON or not
+        :param timeout: timeout for this request, overriding the one of the Server
         """
 
         default_data = {} if sendJson else ""
         data = data if data else default_data
 
-        headers = headers if headers else JsonAcceptHeader.copy()
+        headers = dict(headers) if headers else JsonAcceptHeader.copy()
 
         if not sendJson:
             headers.update(TextSendHeader)
 
         if verb not in RequestVerbs:
             die('Server call verb must be one of %s' % str(RequestVerbs.keys()))
-        if Verbose:
-            echo2("%s Endpoint:" % verb.upper(), servicePath)
-            echo2("%s Request data:" % verb.upper(), data)
-            echo2("%s Request headers:" % verb.upper(), headers)
-        verbFn = RequestVerbs[verb]
-
-        if sendJson:
-            resp = verbFn(self.serverEndpoint + servicePath, json=data, headers=headers)
+
+        request = ServerRequest(verb, servicePath, data, headers, timeout if timeout else self.timeout, sendJson)
+        try:
+            for middleware in self.middlewares:
+                middleware.beforeRequest(request)
+            resp = request.response = self._call(request)
+            for middleware in reversed(self.middlewares):
+                middleware.afterResponse(request, resp)
+            return self._result(resp, forceText)
+        except Exception as e:
+            for middleware in reversed(self.middlewares):
+                middleware.onError(request, e)
+            raise
+
+    def _call(self, request):
+        """Send a ServerRequest and return the requests.Response"""
+
+        verb, servicePath = request.verb, request.servicePath
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            self.logger.debug('%s %s data: %s headers: %s', verb.upper(), servicePath,
+                              abbreviate(request.data, self.maxLogBody), request.headers)
+
+        url = self.serverEndpoint + servicePath
+        if request.sendJson:
+            resp = self._send(verb, url, request.endpoint, request.timeout, json=request.data, headers=request.headers)
         else:
-            resp = verbFn(self.serverEndpoint + servicePath, data=data, headers=headers)
+            resp = self._send(verb, url, request.endpoint, request.timeout, data=request.data, headers=request.headers)
+
+        if debug:
+            self.logger.debug('%s %s status: %d headers: %s body: %s', verb.upper(), servicePath, resp.status_code,
+                              resp.headers, abbreviate(resp.text, self.maxLogBody))
+        return resp
+
+    def _result(self, resp, forceText):
+        """Check the status of a response and return its parsed body"""
 
-        if Verbose:
-            echo2("Response headers:", resp.headers)
-            echo2("Response status:", resp.status_code)
         if resp.status_code != 200:
             if self.raiseErrors:
                 error = NutchException("Unexpected server response: %d" % resp.status_code)
                 error.status_code = resp.status_code
                 raise error
             else:
-                warn('Nutch server returned status:', resp.status_code)
+                self.logger.warning('Nutch server returned status: %d', resp.status_code)
         if forceText or 'content-type' not in resp.headers or resp.headers['content-type'] == 'text/plain':
-            if Verbose:
-                echo2("Response text:", resp.text)
             return resp.text
 
         content_type = resp.headers['content-type']
         if content_type == 'application/json' and not forceText:
-            if Verbose:
-                echo2("Response JSON:", resp.json())
             return resp.json()
         else:
             die('Did not understand server response: %s' % resp.headers)
@@ -172,6 +782,141 @@ class Server:
 defaultServer = lambda: Server(DefaultServerEndpoint)
 
 
+class ServerPool(object):
+    """
+    A group of Nutch RESTful Servers that can be used in place of a Server
+
+    Each crawl is pinned to one member, chosen among the healthy members as the one running the fewest
+    jobs, so all jobs and seed lists of a crawl stay on the same server.  Members are health-checked through
+    /admin at most every healthInterval seconds.  Calls made on the pool itself are routed as follows:
+    configuration changes and /admin/stop go to every healthy member, /job lists the jobs of all healthy
+    members, /job/create, /db/crawldb and /seed/create go to the member of the crawl (or seed list), and other
+    calls are spread round-robin over the healthy members.  A JobClient given a pool works with the member of
+    its crawl, so the calls about its jobs reach the server running them.  A crawl is unpinned when its last
+    round ends, and a seed list as soon as it is uploaded.
+
+    Configuration changes only reach the members that are healthy at the time: a member coming back after
+    being down keeps the configurations it had, and must be updated again (e.g. with ConfigClient.create).
+    """
+
+    def __init__(self, servers, raiseErrors=True, healthInterval=DefaultHealthInterval, **serverArgs):
+        """
+        :param servers: Server objects, or URLs of Nutch servers
+        :param raiseErrors: Raise an exception for non-200 status codes, for Servers created from URLs
+        :param healthInterval: seconds during which the result of a health check is reused
+        :param serverArgs: extra arguments for Servers created from URLs
+        """
+        self.servers = [server if isinstance(server, Server) else Server(server, raiseErrors, **serverArgs)
+                        for server in servers]
+        if not self.servers:
+            raise NutchException("A ServerPool needs at least one server")
+        self.raiseErrors = raiseErrors
+        self.healthInterval = healthInterval
+        self.pins = {}
+        self._health = {}
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for server in self.servers:
+            server.close()
+
+    def use(self, *middlewares):
+        """
+        Add Middlewares to every member of the pool, see Server.use
+
+        :return: this ServerPool
+        """
+        for server in self.servers:
+            server.use(*middlewares)
+        return self
+
+    def metrics(self):
+        """:return: the metrics() snapshot of each member, by server endpoint"""
+        return dict((server.serverEndpoint, server.metrics()) for server in self.servers)
+
+    def isHealthy(self, server):
+        """:return: whether server answered /admin during the last healthInterval seconds"""
+        healthy, checkedAt = self._health.get(server.serverEndpoint, (None, 0))
+        if healthy is None or time() - checkedAt >= self.healthInterval:
+            try:
+                server.call('get', '/admin')
+                healthy = True
+            except Exception as e:
+                log.warning('Nutch server %s failed its health check: %s', server.serverEndpoint, e)
+                healthy = False
+            self._health[server.serverEndpoint] = (healthy, time())
+        return healthy
+
+    def healthy(self):
+        """:return: the list of healthy members, raise NutchException if there are none"""
+        servers = [server for server in self.servers if self.isHealthy(server)]
+        if not servers:
+            raise NutchException("No healthy Nutch server in the pool")
+        return servers
+
+    def load(self, server):
+        """:return: the number of jobs queued or running on server"""
+        return len([job for job in server.call('get', '/job') if job['state'] in ('IDLE', 'RUNNING')])
+
+    def pin(self, key, server):
+        """Send all jobs and seed lists of crawl (or seed list) key to server"""
+        with self._lock:
+            self.pins[key] = server
+
+    def release(self, key):
+        """Forget the server of a finished crawl"""
+        with self._lock:
+            self.pins.pop(key, None)
+
+    def serverFor(self, key):
+        """
+        Return the member that handles the crawl (or seed list) key, pinning it to the least-loaded healthy member
+        the first time it is seen
+        """
+        with self._lock:
+            server = self.pins.get(key)
+        if server is not None:
+            return server
+        # health checks and job counts are requests, made without holding the lock
+        loads = dict((member.serverEndpoint, (member, self.load(member))) for member in self.healthy())
+        with self._lock:
+            server = self.pins.get(key)
+            if server is None:
+                pinned = dict((member.serverEndpoint, 0) for member in self.servers)
+                for member in self.pins.values():
+                    pinned[member.serverEndpoint] += 1
+                server = min(loads.values(), key=lambda load: (load[1], pinned[load[0].serverEndpoint]))[0]
+                self.pins[key] = server
+            return server
+
+    def _roundRobin(self):
+        servers = self.healthy()
+        with self._lock:
+            self._next += 1
+            return servers[self._next % len(servers)]
+
+    def call(self, verb, servicePath, data=None, headers=None, forceText=False, sendJson=True, timeout=None):
+        """Call the member(s) of the pool responsible for servicePath, see Server.call"""
+
+        args = (data, headers, forceText, sendJson, timeout)
+        if (verb != 'get' and servicePath.startswith('/config')) or servicePath == '/admin/stop':
+            return [server.call(verb, servicePath, *args) for server in self.healthy()][0]
+        if verb == 'get' and servicePath == '/job':
+            return [job for server in self.healthy() for job in server.call(verb, servicePath, *args)]
+        if servicePath in ('/job/create', '/db/crawldb'):
+            return self.serverFor(data['crawlId']).call(verb, servicePath, *args)
+        if servicePath == '/seed/create':
+            return self.serverFor(data['name']).call(verb, servicePath, *args)
+        return self._roundRobin().call(verb, servicePath, *args)
+
+
 class IdEqualityMixin(object):
     """
     Mix-in class to use self.id == other.id to check for equality
@@ -189,44 +934,454 @@ class Job(IdEqualityMixin):
     Representation of a running Nutch job, use JobClient to get a list of running jobs or to create one
     """
 
-    def __init__(self, jid, server):
+    def __init__(self, jid, server, poller=None, jobType=None, scheduler=None):
         self.id = jid
         self.server = server
+        self.poller = poller
+        self.type = jobType
+        self.scheduler = scheduler
+
+    @property
+    def queued(self):
+        """Whether the job is waiting in its JobScheduler for a slot, its id is None until it is submitted"""
+        return self.id is None and self.scheduler is not None
 
     def info(self):
-        """Get current information about this job"""
-        return self.server.call('get', '/job/' + self.id)
+        """
+        Get current information about this job
+
+        If the job is watched by a running JobPoller, the state from its last tick is returned without
+        contacting the server.  A job queued by a JobScheduler is reported IDLE until it is submitted.
+        """
+        if self.scheduler is not None:
+            self.scheduler.dispatch()
+            if self.id is None:
+                return self.scheduler.queuedInfo(self)
+        jobInfo = None
+        if self.poller and self.poller.running:
+            jobInfo = self.poller.info(self.id)
+        if jobInfo is None:
+            jobInfo = self.server.call('get', '/job/' + self.id)
+            if self.poller:
+                self.poller.update(jobInfo)
+        if self.scheduler is not None:
+            self.scheduler.update(self, jobInfo)
+        return jobInfo
 
     def stop(self):
+        if self.queued and self.scheduler.cancel(self, 'stop'):
+            return True
         return self.server.call('get', '/job/%s/stop' % self.id)
 
     def abort(self):
+        if self.queued and self.scheduler.cancel(self, 'abort'):
+            return True
         return self.server.call('get', '/job/%s/abort' % self.id)
 
 
+class JobPoller(object):
+    """
+    Tracks the state of all jobs on a server with a single GET /job per tick
+
+    Jobs and CrawlClients that share a JobPoller read their job states from its table instead of
+    issuing one GET /job/<id> each, so the request cost of a tick does not depend on the number of crawls.
+    Use Nutch.JobPoller() to create a running poller, and pass it to Nutch.Jobs() or Nutch.Crawl().
+    """
+
+    def __init__(self, server, interval=DefaultPollInterval):
+        """
+        :param server: the Server to poll
+        :param interval: seconds between two ticks
+        """
+        self.server = server
+        self.interval = interval
+        self.ticks = 0
+        self._states = {}
+        self._seeded = {}
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def info(self, jid):
+        """
+        :return: the last known JobInfo of job jid, or None if the poller has not seen it
+        """
+        with self._cond:
+            return self._states.get(jid)
+
+    def update(self, jobInfo):
+        """
+        Record a JobInfo obtained outside of a tick, e.g. from /job/create, until the next tick reports it
+        """
+        if not isinstance(jobInfo, dict) or 'id' not in jobInfo:
+            return
+        with self._cond:
+            self._states[jobInfo['id']] = jobInfo
+            self._seeded[jobInfo['id']] = self.ticks
+            self._cond.notify_all()
+
+    def tick(self):
+        """Refresh the state of every job with one request, and wake up all waiters"""
+        with self._cond:
+            self.ticks += 1
+            tick = self.ticks
+        jobs = self.server.call('get', '/job')
+        with self._cond:
+            states = dict((jobInfo['id'], jobInfo) for jobInfo in jobs)
+            for jid, seededAt in list(self._seeded.items()):
+                if jid in states or seededAt < tick:
+                    # reported by the server, or gone from its job list: trust the server
+                    del self._seeded[jid]
+                else:
+                    # created while the request was in flight
+                    states[jid] = self._states[jid]
+            self._states = states
+            self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        """
+        Block until the next tick (or seeded update), or until timeout seconds have passed
+        """
+        with self._cond:
+            self._cond.wait(timeout)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                log.warning('JobPoller tick failed: %s', e)
+            self._stopped.wait(self.interval)
+
+    def start(self):
+        """Start polling in a background thread, return self"""
+        if not self.running:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='nutch-job-poller')
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the background thread, Jobs will go back to querying the server directly"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class JobScheduler(object):
+    """
+    Client-side admission control of the jobs submitted by many crawls
+
+    Every JobClient.create of a JobClient given this scheduler goes through it: the job is submitted right away
+    if the concurrency caps of its server allow it, otherwise a queued Job is returned (its id is None and
+    info() reports it IDLE) and it is submitted once a slot frees up.  A slot is freed when a scheduled job
+    is seen in a final state, by Job.info() or by the GET /job the scheduler issues on a server at most every
+    interval seconds while jobs are waiting for it.
+
+    Waiting jobs are submitted by descending crawl priority, then for the crawl with the fewest scheduled jobs
+    running (and then the fewest submitted so far), then in order of arrival, so crawls of equal priority get
+    a fair share of the slots.  Jobs created without the scheduler are not counted.
+
+    Requests to the servers are made without holding the scheduler lock: a slow server only delays the
+    submissions to that server, not the job states read by other crawls.
+    """
+
+    def __init__(self, maxPerServer=None, maxPerType=None, interval=DefaultPollInterval):
+        """
+        :param maxPerServer: the maximum number of scheduled jobs running on each server, None for no limit
+        :param maxPerType: a dict of job type to the maximum number of scheduled jobs of that type running on
+         each server, e.g. {'FETCH': 4}
+        :param interval: minimum number of seconds between two GET /job on a server with waiting jobs
+        """
+        self.maxPerServer = maxPerServer
+        self.maxPerType = dict((jobType.upper(), limit) for jobType, limit in (maxPerType or {}).items())
+        self.interval = interval
+        self.priorities = {}
+        self._queue = []
+        # serverEndpoint -> {job id: (job type, crawlId, sequence)}, keyed by the _ScheduledJob while in flight
+        self._running = collections.defaultdict(dict)
+        self._refreshed = {}
+        self._submitted = collections.Counter()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def setPriority(self, crawlId, priority):
+        """
+        Set the priority of the jobs of a crawl, higher priorities are submitted first (the default is 0)
+        """
+        with self._lock:
+            self.priorities[crawlId] = priority
+        self.dispatch()
+
+    def queued(self, crawlId=None):
+        """:return: the Jobs waiting for a slot, of crawlId or of all crawls"""
+        with self._lock:
+            return [entry.job for entry in self._queue if crawlId is None or entry.crawlId == crawlId]
+
+    def running(self, serverEndpoint=None):
+        """:return: the number of scheduled jobs running (or being submitted) on serverEndpoint, or on all servers"""
+        with self._lock:
+            if serverEndpoint is not None:
+                return len(self._running.get(serverEndpoint, ()))
+            return sum(len(jobs) for jobs in self._running.values())
+
+    def submit(self, jobClient, parameters):
+        """
+        Queue the creation of a job, and submit the jobs that fit the caps
+
+        :param jobClient: the JobClient creating the job
+        :param parameters: the body of the /job/create request
+        :return: the Job, queued if it is still waiting for a slot
+        """
+        job = Job(None, jobClient.server, jobClient.poller, parameters['type'], self)
+        entry = _ScheduledJob(job, jobClient, parameters, next(self._sequence))
+        job._entry = entry
+        with self._lock:
+            self._queue.append(entry)
+        self.dispatch()
+        if entry.error is not None:
+            raise entry.error
+        if job.queued:
+            log.info('Queued %s job of crawl %s', job.type, entry.crawlId)
+        return job
+
+    def adopt(self, job, crawlId):
+        """
+        Count a job submitted outside of the scheduler (e.g. by a crawl before it was resumed) as running
+        """
+        with self._lock:
+            job.scheduler = self
+            self._running[job.server.serverEndpoint][job.id] = (job.type, crawlId, next(self._sequence))
+
+    def cancel(self, job, action='abort'):
+        """
+        Remove a queued job from the queue, it will be reported KILLED
+
+        A job that is being submitted is stopped or aborted on its server as soon as it has been created.
+
+        :param action: 'stop' or 'abort', what to do with the job if it is being submitted
+        :return: True if the job had not been submitted yet, False if it has an id to stop or abort
+        """
+        with self._lock:
+            entry = getattr(job, '_entry', None)
+            if entry is None or job.id is not None:
+                return False
+            if entry in self._queue:
+                self._queue.remove(entry)
+            entry.cancelled = True
+            entry.action = action
+            return True
+
+    def queuedInfo(self, job):
+        """
+        :return: a JobInfo for a job that has not been submitted yet
+        :raise: the error of its submission, if it failed
+        """
+        entry = job._entry
+        if entry.error is not None:
+            raise entry.error
+        return {'id': None, 'type': job.type, 'confId': entry.parameters.get('confId'), 'crawlId': entry.crawlId,
+                'args': entry.parameters.get('args'), 'state': 'KILLED' if entry.cancelled else 'IDLE',
+                'msg': 'Cancelled by the JobScheduler' if entry.cancelled else 'Queued by the JobScheduler'}
+
+    def update(self, job, jobInfo):
+        """
+        Record the state of a job, freeing its slot and dispatching waiting jobs once it is final
+        """
+        if jobInfo.get('state') in ('IDLE', 'RUNNING'):
+            return
+        with self._lock:
+            released = self._running[job.server.serverEndpoint].pop(job.id, None) is not None
+        if released:
+            self.dispatch()
+
+    def dispatch(self):
+        """
+        Submit waiting jobs, as long as there are free slots for them
+        """
+        with self._lock:
+            if not self._queue:
+                return
+            stale = self._stale()
+        for serverEndpoint, server, sequence in stale:
+            self._refresh(serverEndpoint, server, sequence)
+
+        with self._lock:
+            launches = []
+            entry = self._next()
+            while entry is not None:
+                # hold the slot while the job is being created
+                self._queue.remove(entry)
+                self._running[entry.serverEndpoint][entry] = (entry.job.type, entry.crawlId, None)
+                launches.append(entry)
+                entry = self._next()
+        failed = [entry for entry in launches if not self._launch(entry)]
+        if failed:
+            self.dispatch()
+
+    def _fits(self, entry):
+        running = self._running[entry.serverEndpoint]
+        if self.maxPerServer is not None and len(running) >= self.maxPerServer:
+            return False
+        limit = self.maxPerType.get(entry.job.type)
+        return limit is None or sum(1 for value in running.values() if value[0] == entry.job.type) < limit
+
+    def _next(self):
+        """:return: the waiting job to submit next, or None if none of them fits"""
+        runningPerCrawl = collections.Counter(value[1] for jobs in self._running.values() for value in jobs.values())
+        candidates = [entry for entry in self._queue if self._fits(entry)]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda entry: (-self.priorities.get(entry.crawlId, 0),
+                                                  runningPerCrawl[entry.crawlId], self._submitted[entry.crawlId],
+                                                  entry.arrival))
+
+    def _stale(self):
+        """
+        :return: (serverEndpoint, Server, sequence) for the servers blocking waiting jobs that are due for a
+         GET /job, marking them as refreshed
+        """
+        now = time()
+        stale = []
+        for entry in self._queue:
+            serverEndpoint = entry.serverEndpoint
+            if (self._fits(entry) or serverEndpoint in [endpoint for endpoint, server, sequence in stale]
+                    or now - self._refreshed.get(serverEndpoint, 0) < self.interval):
+                continue
+            self._refreshed[serverEndpoint] = now
+            stale.append((serverEndpoint, entry.jobClient.server, next(self._sequence)))
+        return stale
+
+    def _refresh(self, serverEndpoint, server, sequence):
+        """Drop the jobs submitted before sequence which ended unnoticed, or are unknown to the server"""
+        try:
+            jobs = dict((jobInfo['id'], jobInfo) for jobInfo in server.call('get', '/job'))
+        except NutchException as e:
+            log.warning('JobScheduler could not list the jobs of %s: %s', serverEndpoint, e)
+            return
+        with self._lock:
+            running = self._running[serverEndpoint]
+            for jid, (jobType, crawlId, submitted) in list(running.items()):
+                if submitted is None or submitted > sequence:
+                    # being submitted, or submitted after the list was requested
+                    continue
+                if jid not in jobs or jobs[jid].get('state') not in ('IDLE', 'RUNNING'):
+                    del running[jid]
+
+    def _launch(self, entry):
+        """Create the job of entry, which holds a slot, :return: whether it was created"""
+        try:
+            jobInfo = entry.jobClient._post(entry.parameters)
+        except Exception as e:
+            log.warning('Submission of queued %s job of crawl %s failed: %s', entry.job.type, entry.crawlId, e)
+            with self._lock:
+                del self._running[entry.serverEndpoint][entry]
+                entry.error = e
+            return False
+        with self._lock:
+            del self._running[entry.serverEndpoint][entry]
+            entry.job.id = jobInfo['id']
+            self._running[entry.serverEndpoint][entry.job.id] = (entry.job.type, entry.crawlId, next(self._sequence))
+            self._submitted[entry.crawlId] += 1
+            cancelled = entry.cancelled
+        if cancelled:
+            # stop() or abort() was called while the job was being created
+            try:
+                entry.jobClient.server.call('get', '/job/%s/%s' % (entry.job.id, entry.action))
+            except Exception as e:
+                log.warning('Could not %s job %s of crawl %s: %s', entry.action, entry.job.id, entry.crawlId, e)
+        return True
+
+
+class _ScheduledJob(object):
+    """A job submission held by a JobScheduler"""
+
+    def __init__(self, job, jobClient, parameters, arrival):
+        self.job = job
+        self.jobClient = jobClient
+        self.parameters = parameters
+        self.crawlId = parameters['crawlId']
+        self.serverEndpoint = jobClient.server.serverEndpoint
+        self.arrival = arrival
+        self.cancelled = False
+        self.action = None
+        self.error = None
+
+
 class Config(IdEqualityMixin):
     """
     Representation of an active Nutch configuration
 
     Use ConfigClient to get a list of configurations or create a new one
+
+    The parameter map returned by info() is cached for ttl seconds, and config[param] is served from it;
+    writes through this object update the cache in place.  Call invalidate() to drop the cache.
     """
 
-    def __init__(self, cid, server):
+    def __init__(self, cid, server, ttl=DefaultConfigTTL):
+        """
+        :param cid: the name of the configuration
+        :param server: the Server holding the configuration
+        :param ttl: seconds during which cached parameters are used, None to keep them until invalidate(),
+         0 to disable the cache
+        """
         self.id = cid
         self.server = server
+        self.ttl = ttl
+        self._params = None
+        self._fetchedAt = 0
 
     def __str__(self):
         return "Config(id:%s, ...)" %self.id
 
+    def _cached(self):
+        if self._params is None or self.ttl == 0:
+            return None
+        if self.ttl is not None and time() - self._fetchedAt >= self.ttl:
+            return None
+        return self._params
+
+    def invalidate(self):
+        """Drop the cached parameters, the next read goes to the server"""
+        self._params = None
+
     def delete(self):
+        self.invalidate()
         return self.server.call('delete', '/config/' + self.id)
 
     def info(self):
-        return self.server.call('get', '/config/' + self.id)
+        """Get all parameters of this configuration from the server, and refresh the cache"""
+        params = self.server.call('get', '/config/' + self.id)
+        if isinstance(params, dict):
+            self._params = dict(params)
+            self._fetchedAt = time()
+        return params
+
+    def params(self):
+        """
+        :return: a copy of all parameters of this configuration, from the cache if it is fresh
+        """
+        params = self._cached()
+        if params is None:
+            return self.info()
+        return dict(params)
 
     def parameter(self, parameterId):
         return self.server.call('get', '/config/%s/%s' % (self.id, parameterId))
 
+    def __contains__(self, item):
+        params = self._cached()
+        if params is None:
+            self.info()
+            params = self._params or {}
+        return item in params
+
     def __getitem__(self, item):
         """
         Overload [] to provide get access to parameters
@@ -234,6 +1389,9 @@ class Config(IdEqualityMixin):
         :return: the parameter if the name is valid, otherwise raise NutchException
         """
 
+        params = self._cached()
+        if params is not None and item in params:
+            return params[item]
         return self.server.call('get', '/config/%s/%s' % (self.id, item), forceText=True)
 
     def __setitem__(self, key, value):
@@ -245,8 +1403,40 @@ class Config(IdEqualityMixin):
         """
 
         self.server.call('put', '/config/%s/%s' % (self.id, key), value, sendJson=False)
+        if self._params is not None:
+            # the server keeps parameters as text
+            self._params[key] = str(value)
         return value
 
+    def update(self, mapping, bulkThreshold=DefaultConfigBulkThreshold):
+        """
+        Set many parameters at once, sending only the ones that differ from the current configuration
+
+        Up to bulkThreshold changed parameters are sent one PUT each; above that, the configuration is
+        re-created with all its parameters in a single /config/create request, starting from parameters freshly
+        read from the server so that changes made by other clients since they were cached are kept.
+
+        :param mapping: the parameters to set
+        :param bulkThreshold: the largest number of changes sent as individual PUTs
+        :return: a dict mapping each changed parameter to its (old, new) values, old being None for new parameters
+        """
+
+        diff = lambda current: dict((key, (current.get(key), value)) for key, value in mapping.items()
+                                    if current.get(key) != str(value))
+        changes = diff(self.params())
+        if len(changes) > bulkThreshold:
+            current = self.info()
+            changes = diff(current)
+            params = dict(current)
+            params.update((key, str(value)) for key, (old, value) in changes.items())
+            ConfigClient(self.server).create(self.id, params)
+            self._params = params
+            self._fetchedAt = time()
+        else:
+            for key, (old, value) in changes.items():
+                self[key] = value
+        return changes
+
 
 class Seed(IdEqualityMixin):
     """
@@ -262,18 +1452,21 @@ class Seed(IdEqualityMixin):
 
 
 class ConfigClient:
-    def __init__(self, server):
+    def __init__(self, server, ttl=DefaultConfigTTL):
         """Nutch Config client
 
         List named configurations, create new ones, or delete them with methods to get the list of named
         configurations, get parameters for a named configuration, get an individual parameter of a named
         configuration, create a new named configuration using a parameter dictionary, and delete a named configuration.
+
+        :param ttl: lifetime of the parameter cache of the returned Configs, see Config
         """
         self.server = server
+        self.ttl = ttl
 
     def list(self):
         configs = self.server.call('get', '/config')
-        return [Config(cid, self.server) for cid in configs]
+        return [Config(cid, self.server, self.ttl) for cid in configs]
 
     def create(self, cid, configData):
         """
@@ -281,7 +1474,7 @@ class ConfigClient:
         """
         configArgs = {'configId': cid, 'params': configData, 'force': True}
         cid = self.server.call('post', "/config/create", configArgs, forceText=True, headers=TextAcceptHeader)
-        new_config = Config(cid, self.server)
+        new_config = Config(cid, self.server, self.ttl)
         return new_config
 
     def __getitem__(self, item):
@@ -291,8 +1484,8 @@ class ConfigClient:
         :return: the Config object if the name is valid, otherwise raise KeyError
         """
 
-        # let's be optimistic...
-        config = Config(item, self.server)
+        # let's be optimistic...  the parameters fetched here are kept in the cache of the Config
+        config = Config(item, self.server, self.ttl)
         if config.info():
             return config
 
@@ -307,13 +1500,88 @@ class ConfigClient:
         :return: the created Config object
         """
 
-        if not isinstance(value, collections.Mapping):
+        if not isinstance(value, Mapping):
             raise TypeError(repr(value) + "is not a dict-like object")
         return self.create(key, value)
 
+    def template(self, baseId):
+        """
+        Fetch the parameters of configuration baseId once, to derive many configurations from them
+
+        :param baseId: the name of the base configuration
+        :return: a ConfigTemplate
+        """
+        return ConfigTemplate(self, baseId)
+
+
+class ConfigTemplate(object):
+    """
+    The cached parameters of a base configuration, from which configurations are derived with a few overrides
+
+    Use ConfigClient.template() to create one.
+    """
+
+    def __init__(self, configClient, baseId):
+        self.configClient = configClient
+        self.baseId = baseId
+        self.params = None
+        self.refresh()
+
+    def refresh(self):
+        """Fetch the parameters of the base configuration again"""
+        self.params = self.configClient[self.baseId].params()
+
+    def derive(self, cid, overrides=None):
+        """
+        Create (or replace) configuration cid from the base parameters and overrides
+
+        :return: the created Config, with its parameter cache already filled
+        """
+        params = dict(self.params)
+        # the server keeps parameters as text
+        params.update((key, str(value)) for key, value in (overrides or {}).items())
+        config = self.configClient.create(cid, params)
+        config._params = params
+        config._fetchedAt = time()
+        return config
+
+    def deriveMany(self, specs, workers=DefaultConfigWorkers):
+        """
+        Create many derived configurations, submitting up to `workers` of them concurrently
+
+        :param specs: a mapping of configuration name to its overrides
+        :param workers: the maximum number of concurrent requests
+        :return: a dict mapping each configuration name to its created Config
+        """
+        # a plain threading pool, concurrent.futures is not available on Python 2 without the futures backport
+        pending = iter(list(specs.items()))
+        configs = {}
+        errors = []
+        lock = threading.Lock()
+
+        def work():
+            while True:
+                with lock:
+                    spec = next(pending, None)
+                if spec is None or errors:
+                    return
+                try:
+                    configs[spec[0]] = self.derive(*spec)
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=work) for worker in range(min(workers, len(specs)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return configs
+
 
 class JobClient:
-    def __init__(self, server, crawlId, confId, parameters=None):
+    def __init__(self, server, crawlId, confId, parameters=None, poller=None, scheduler=None):
         """
         Nutch Job client with methods to list, create jobs.
 
@@ -323,13 +1591,19 @@ class JobClient:
         :param crawlId:
         :param confId:
         :param parameters:
+        :param poller: a JobPoller shared by the Jobs of this client
+        :param scheduler: a JobScheduler the jobs created by this client are submitted through
         :return:
         """
 
-        self.server = server
+        # with a ServerPool, work with the member of the crawl so calls about its jobs reach the right server
+        self.pool = server if isinstance(server, ServerPool) else None
+        self.server = server.serverFor(crawlId) if self.pool else server
         self.crawlId = crawlId
         self.confId = confId
         self.parameters=parameters if parameters else {'args': dict()}
+        self.poller = poller
+        self.scheduler = scheduler
 
     def _job_owned(self, job):
         return job['crawlId'] == self.crawlId and job['confId'] == self.confId
@@ -338,36 +1612,44 @@ class JobClient:
         """
         Return list of jobs at this endpoint.
 
-        Call get(allJobs=True) to see all jobs, not just the ones managed by this Client
+        Call get(allJobs=True) to see all jobs, not just the ones managed by this Client.
+        With a ServerPool, only the jobs of the member running this crawl are listed.
         """
 
         jobs = self.server.call('get', '/job')
 
-        return [Job(job['id'], self.server) for job in jobs if allJobs or self._job_owned(job)]
+        return [Job(job['id'], self.server, self.poller, job.get('type'), self.scheduler)
+                for job in jobs if allJobs or self._job_owned(job)]
 
     def create(self, command, **args):
         """
         Create a job given a command
         :param command: Nutch command, one of nutch.LegalJobs
         :param args: Additional arguments to pass to the job
-        :return: The created Job
+        :return: The created Job, which may still be queued if the client has a JobScheduler
         """
 
         command = command.upper()
         if command not in LegalJobs:
-            warn('Nutch command must be one of: %s' % ', '.join(LegalJobs))
+            log.warning('Nutch command must be one of: %s', ', '.join(LegalJobs))
         else:
-            echo2('Starting %s job with args %s' % (command, str(args)))
+            log.info('Starting %s job with args %s', command, args)
         parameters = self.parameters.copy()
         parameters['type'] = command
         parameters['crawlId'] = self.crawlId
         parameters['confId'] = self.confId
-        parameters['args'].update(args)
+        parameters['args'] = dict(self.parameters['args'], **args)
 
-        job_info = self.server.call('post', "/job/create", parameters, JsonAcceptHeader)
+        if self.scheduler is not None:
+            return self.scheduler.submit(self, parameters)
+        job_info = self._post(parameters)
+        return Job(job_info['id'], self.server, self.poller, command)
 
-        job = Job(job_info['id'], self.server)
-        return job
+    def _post(self, parameters):
+        job_info = self.server.call('post', "/job/create", parameters, JsonAcceptHeader)
+        if self.poller:
+            self.poller.update(job_info)
+        return job_info
 
     # some short-hand functions
 
@@ -407,6 +1689,144 @@ class JobClient:
         return self.server.call('post', '/db/crawldb', statsArgs)
 
 
+DefaultPorts = {'http': 80, 'https': 443}
+
+
+def normalizeUrl(url):
+    """
+    Normalize a seed URL so that equivalent spellings compare equal
+
+    Surrounding whitespace and the fragment are removed, the scheme (http if missing) and host are lower-cased,
+    the default port is dropped, an empty path becomes '/' and a trailing slash is removed from other paths.
+    Raises ValueError if the URL has a malformed port.
+    """
+    url = url.strip()
+    if '://' not in url:
+        url = 'http://' + url
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or '').lower()
+    if ':' in netloc:
+        # IPv6 literal
+        netloc = '[%s]' % netloc
+    if parts.port and parts.port != DefaultPorts.get(scheme):
+        netloc += ':%d' % parts.port
+    if parts.username:
+        netloc = parts.netloc.rsplit('@', 1)[0] + '@' + netloc
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((scheme, netloc, path, parts.query, ''))
+
+
+class BloomFilter(object):
+    """
+    Set membership in a fixed amount of memory, with a bounded rate of false positives
+
+    Sized for `capacity` items with a false positive rate of `errorRate`, e.g. about 1.8 MB
+    for one million items at 0.1%.
+    """
+
+    def __init__(self, capacity, errorRate=0.001):
+        self.size = max(8, int(math.ceil(-capacity * math.log(errorRate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.md5(item.encode('utf-8')).hexdigest()
+        h1, h2 = int(digest[:16], 16), int(digest[16:], 16)
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        """Add item, return False if it was (probably) already present"""
+        added = False
+        for position in self._positions(item):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                added = True
+        return added
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class ExactFilter(set):
+    """
+    Exact set membership, with the add() protocol of BloomFilter
+    """
+
+    def add(self, item):
+        if item in self:
+            return False
+        set.add(self, item)
+        return True
+
+
+class SeedFilter(object):
+    """
+    Normalize and deduplicate seed URLs before they are uploaded
+
+    dedup is 'exact' (a set, memory grows with the number of URLs), 'bloom' (a BloomFilter of fixed size,
+    which may drop a few unique URLs at the given errorRate) or None.  After filtering, `dropped` holds the
+    number of URLs removed as duplicates or blanks, and `kept` the number of URLs passed on.
+    """
+
+    def __init__(self, normalize=True, dedup='exact', capacity=10000000, errorRate=0.001):
+        """
+        :param normalize: apply normalizeUrl to every URL
+        :param dedup: 'exact', 'bloom' or None
+        :param capacity: expected number of unique URLs, for dedup='bloom'
+        :param errorRate: false positive rate, for dedup='bloom'
+        """
+        self.normalize = normalize
+        if dedup == 'bloom':
+            self.seen = BloomFilter(capacity, errorRate)
+        elif dedup == 'exact':
+            self.seen = ExactFilter()
+        elif dedup is None:
+            self.seen = None
+        else:
+            raise NutchException("Unknown dedup mode: %s" % dedup)
+        self.kept = 0
+        self.dropped = 0
+
+    def filter(self, urls):
+        """Lazily yield the URLs to keep"""
+        for url in urls:
+            url = url.strip()
+            if url and self.normalize:
+                try:
+                    url = normalizeUrl(url)
+                except ValueError as e:
+                    log.debug('Dropping malformed seed URL %s: %s', url, e)
+                    url = None
+            if not url or (self.seen is not None and not self.seen.add(url)):
+                self.dropped += 1
+                continue
+            self.kept += 1
+            yield url
+
+
+def openSeedFile(filename):
+    """
+    Open a seed file for reading as text, decompressing .gz and .bz2 files on the fly
+    """
+    if filename.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(filename, 'rb'))
+    if filename.endswith('.bz2'):
+        return io.TextIOWrapper(bz2.BZ2File(filename, 'rb'))
+    return open(filename)
+
+
+def iterSeedFile(filename):
+    """
+    Lazily yield the whitespace separated URLs of a (possibly compressed) seed file
+    """
+    with openSeedFile(filename) as f:
+        for line in f:
+            for url in line.split():
+                yield url
+
+
 class SeedClient():
 
     def __init__(self, server):
@@ -416,19 +1836,22 @@ class SeedClient():
         """
         self.server = server
 
-    def create(self, sid, seedList):
+    def create(self, sid, seedList, seedFilter=None):
         """
         Create a new named (sid) Seed from a list of seed URLs
 
         :param sid: the name to assign to the new seed list
-        :param seedList: the list of seeds to use
+        :param seedList: the seeds to use, an iterable of URLs or a single URL
+        :param seedFilter: a SeedFilter to normalize and deduplicate the seeds with
         :return: the created Seed object
         """
 
         seedUrl = lambda uid, url: {"id": uid, "url": url}
 
-        if not isinstance(seedList,tuple):
+        if isinstance(seedList, string_types):
             seedList = (seedList,)
+        if seedFilter:
+            seedList = seedFilter.filter(seedList)
 
         seedListData = {
             "id": "12345",
@@ -437,127 +1860,919 @@ class SeedClient():
         }
 
         # As per resolution of https://issues.apache.org/jira/browse/NUTCH-2123
-        seedPath = self.server.call('post', "/seed/create", seedListData, TextAcceptHeader)
-        new_seed = Seed(sid, seedPath, self.server)
+        server = self.server.serverFor(sid)
+        seedPath = server.call('post', "/seed/create", seedListData, TextAcceptHeader)
+        if isinstance(self.server, ServerPool):
+            # the Seed keeps its server
+            self.server.release(sid)
+        new_seed = Seed(sid, seedPath, server)
         return new_seed
 
-    def createFromFile(self, sid, filename):
+    def createStream(self, sid, urls, chunkSize=DefaultSeedChunkSize, progress=None, seedFilter=None):
+        """
+        Upload a stream of URLs as consecutive seed lists of at most chunkSize URLs
+
+        URLs are consumed lazily, so memory use depends on chunkSize only.  Seed list i is named
+        '<sid>_part<i>'; the returned list of Seeds can be passed as is to Nutch.Crawl, which injects them all.
+
+        :param sid: the prefix of the names of the seed lists
+        :param urls: an iterable of URLs
+        :param chunkSize: maximum number of URLs per seed list
+        :param progress: a function called as progress(seeds, urls) after each upload, with the number of seed
+         lists and of URLs uploaded so far
+        :param seedFilter: a SeedFilter to normalize and deduplicate the whole stream with
+        :return: the list of created Seed objects
+        """
+
+        seeds = []
+        uploaded = 0
+        urls = seedFilter.filter(urls) if seedFilter else iter(urls)
+        while True:
+            chunk = list(islice(urls, chunkSize))
+            if not chunk:
+                break
+            partId = '%s_part%05d' % (sid, len(seeds))
+            # keep all parts on the server of the first one
+            seedClient = SeedClient(seeds[0].server) if seeds else self
+            seeds.append(seedClient.create(partId, chunk))
+            uploaded += len(chunk)
+            if progress:
+                progress(len(seeds), uploaded)
+        return seeds
+
+    def createFromFile(self, sid, filename, chunkSize=None, progress=None, seedFilter=None):
         """
         Create a new named (sid) Seed from a file containing URLs
-        It's assumed URLs are whitespace seperated.
+        It's assumed URLs are whitespace seperated.  Files ending in .gz or .bz2 are decompressed.
 
         :param sid: the name to assign to the new seed list
         :param filename: the name of the file that contains URLs
-        :return: the created Seed object
+        :param chunkSize: if given, stream the file as seed lists of at most chunkSize URLs, see createStream
+        :param progress: progress callback of createStream
+        :param seedFilter: a SeedFilter to normalize and deduplicate the seeds with
+        :return: the created Seed object, or the list of created Seeds if chunkSize is given
         """
 
-        urls = []
-        with open(filename) as f:
-            for line in f:
-                for url in line.split():
-                    urls.append(url)
+        if chunkSize:
+            return self.createStream(sid, iterSeedFile(filename), chunkSize, progress, seedFilter)
+        return self.create(sid, tuple(iterSeedFile(filename)), seedFilter)
 
-        return self.create(sid, tuple(urls))
 
-class CrawlClient():
-    def __init__(self, server, seed, jobClient, rounds, index):
-        """Nutch Crawl manager
+class FixedPolling(object):
+    """
+    Poll the current job of a crawl at a fixed interval
+    """
 
-        High-level Nutch client for managing crawls.
+    def __init__(self, interval=1):
+        self.interval = interval
 
-        When this client is initialized, the seedList will automatically be injected.
-        There are four ways to proceed from here.
+    def delay(self, jobType, elapsed):
+        """
+        :param jobType: the type of the job being waited for, one of nutch.LegalJobs
+        :param elapsed: seconds since the job was submitted
+        :return: seconds to wait before checking the job again
+        """
+        return self.interval
 
-        progress() - checks the status of the current job, enqueue the next job if the current job is finished,
-                     and return immediately
-        waitJob() - wait until the current job is finished and return
-        waitRound() - wait and enqueue jobs until the current round is finished and return
-        waitAll() - wait and enqueue jobs until all rounds are finished and return
+    def observe(self, jobType, duration):
+        """Called with the duration (in seconds, measured from submission) of each finished job"""
+        pass
 
-        It is recommended to use progress() in a while loop for any applications that need to remain interactive.
 
+class AdaptivePolling(FixedPolling):
+    """
+    Poll quickly after a job is submitted, then back off exponentially while it keeps running.
+
+    The typical duration of each job type is learned from the jobs observed so far (as an exponentially
+    weighted moving average): until a job reaches the expected duration of its type, the next check is
+    scheduled for that moment; after that, the delay grows with the time the job is overdue.
+    Delays are clamped to [minDelay, maxDelay] and randomized by +/- jitter to spread the load of many crawls.
+    Share one instance between crawls to let them learn from each other.
+    """
+
+    def __init__(self, minDelay=0.25, maxDelay=30, factor=2, jitter=0.1, smoothing=0.3):
         """
-        self.server = server
+        :param minDelay: shortest delay between two checks of a job, in seconds
+        :param maxDelay: longest delay between two checks of a job, in seconds
+        :param factor: growth factor of the delay while a job is overdue
+        :param jitter: relative random variation applied to every delay
+        :param smoothing: weight of the latest duration in the learned duration of a job type
+        """
+        self.minDelay = minDelay
+        self.maxDelay = maxDelay
+        self.factor = factor
+        self.jitter = jitter
+        self.smoothing = smoothing
+        self.durations = {}
+
+    def delay(self, jobType, elapsed):
+        expected = self.durations.get(jobType, 0)
+        if elapsed < expected:
+            delay = expected - elapsed
+        else:
+            delay = (elapsed - expected) * (self.factor - 1)
+        delay = min(self.maxDelay, max(self.minDelay, delay))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def observe(self, jobType, duration):
+        expected = self.durations.get(jobType)
+        if expected is None:
+            self.durations[jobType] = duration
+        else:
+            self.durations[jobType] = expected + self.smoothing * (duration - expected)
+
+
+class PhaseTiming(object):
+    """
+    Timing of one job of a crawl round
+
+    Times are client-side epoch seconds: submitted when the job was created (or queued by a JobScheduler),
+    started when it was first seen RUNNING and finished when it was first seen in a final state, so started and
+    finished are only as precise as the polling.  started is None if the job was never seen running.
+    """
+
+    def __init__(self, job, round, submitted):
+        self.job = job
+        self.jobType = job.type
+        self.round = round
+        self.submitted = submitted
+        self.started = None
+        self.finished = None
+        self.state = None
+
+    @property
+    def jobId(self):
+        """The id of the job, None while it is queued by a JobScheduler"""
+        return self.job.id
+
+    @property
+    def queueWait(self):
+        """Seconds between submission and start, or None if unknown"""
+        return self.started - self.submitted if self.started is not None else None
+
+    @property
+    def duration(self):
+        """Seconds between start (or submission if unknown) and end, or None if the job is not finished"""
+        if self.finished is None:
+            return None
+        return self.finished - (self.started if self.started is not None else self.submitted)
+
+    def observe(self, state, now):
+        if state == 'RUNNING' and self.started is None:
+            self.started = now
+        elif state not in ('IDLE', 'RUNNING') and self.finished is None:
+            self.finished = now
+            self.state = state
+
+    def toDict(self):
+        return {'round': self.round, 'jobId': self.jobId, 'type': self.jobType, 'state': self.state,
+                'submitted': self.submitted, 'started': self.started, 'finished': self.finished,
+                'queueWait': self.queueWait, 'duration': self.duration}
+
+
+def statsDelta(before, after):
+    """
+    Difference between two JobClient.stats() results
+
+    Numeric values (numbers or numeric strings) present in both are subtracted, nested dicts are compared
+    recursively, and everything else is dropped.
+
+    :return: a dict of the same shape as after
+    """
+    delta = {}
+    for key, value in after.items():
+        if key not in before:
+            continue
+        if isinstance(value, Mapping) and isinstance(before[key], Mapping):
+            delta[key] = statsDelta(before[key], value)
+            continue
+        try:
+            old, new = float(before[key]), float(value)
+        except (TypeError, ValueError):
+            continue
+        diff = new - old
+        delta[key] = int(diff) if diff.is_integer() else diff
+    return delta
+
+
+class RoundReport(object):
+    """
+    Phase timings and crawldb statistics of one crawl round
+
+    Round 1 includes the injection of the seeds.  stats and statsDelta are None unless the crawl was started
+    with roundStats=True.
+    """
+
+    ReportFields = ['round', 'jobId', 'type', 'state', 'submitted', 'started', 'finished', 'queueWait', 'duration']
+
+    def __init__(self, round, statsBefore=None):
+        self.round = round
+        self.phases = []
+        self.started = time()
+        self.finished = None
+        self.statsBefore = statsBefore
+        self.statsAfter = None
+
+    @property
+    def statsDelta(self):
+        if self.statsBefore is None or self.statsAfter is None:
+            return None
+        return statsDelta(self.statsBefore, self.statsAfter)
+
+    def toDict(self):
+        return {'round': self.round, 'started': self.started, 'finished': self.finished,
+                'phases': [phase.toDict() for phase in self.phases], 'stats': self.statsAfter,
+                'statsDelta': self.statsDelta}
+
+
+def writeRoundReportsCsv(reports, out):
+    """
+    Write the phase timings of a list of RoundReports to out as CSV, one row per job
+
+    :param out: a text file object
+    """
+    writer = csv.DictWriter(out, RoundReport.ReportFields)
+    writer.writeheader()
+    for report in reports:
+        for phase in report.phases:
+            writer.writerow(phase.toDict())
+
+
+def writeRoundReportsJson(reports, out):
+    """
+    Write a list of RoundReports to out as a JSON list, including the crawldb statistics
+
+    :param out: a text file object
+    """
+    json.dump([report.toDict() for report in reports], out, indent=2)
+
+
+class PipelineNode(object):
+    """
+    One job of a crawl round in a Pipeline
+    """
+
+    def __init__(self, name, jobType=None, args=None, after=(), condition=None):
+        """
+        :param name: the name of the node, unique in its Pipeline
+        :param jobType: the Nutch command to run, one of nutch.LegalJobs, by default the upper-cased name
+        :param args: extra arguments of the job, see JobClient.create
+        :param after: the names of the nodes that must be done before this one is started
+        :param condition: a function called as condition(round, crawlClient) when the node is ready, the node is
+         skipped in that round if it returns False.  A skipped node counts as done for the nodes after it.
+        """
+        self.name = name
+        self.jobType = (jobType if jobType else name).upper()
+        self.args = dict(args) if args else {}
+        self.after = tuple(after)
+        self.condition = condition
+
+    def __repr__(self):
+        return "PipelineNode(%s, after=%s)" % (self.name, list(self.after))
+
+
+def everyNthRound(n, lastRound=True):
+    """
+    A PipelineNode condition that holds in rounds n, 2n, ... and, if lastRound, in the last round of the crawl
+    """
+    return lambda round, crawlClient: round % n == 0 or (lastRound and round == crawlClient.totalRounds)
+
+
+class Pipeline(object):
+    """
+    The jobs of a crawl round, as a DAG of PipelineNodes
+
+    A CrawlClient starts every node whose predecessors are done at once, so independent nodes run
+    concurrently.  The default pipeline runs GENERATE, FETCH, PARSE, UPDATEDB, INVERTLINKS, DEDUP and INDEX one
+    after the other; a pipeline that inverts links while the crawldb is updated, and indexes every 5 rounds:
+
+        Pipeline([PipelineNode('generate'), PipelineNode('fetch', after=['generate']),
+                  PipelineNode('parse', after=['fetch']), PipelineNode('updatedb', after=['parse']),
+                  PipelineNode('invertlinks', after=['parse']), PipelineNode('dedup', after=['updatedb']),
+                  PipelineNode('index', after=['dedup', 'invertlinks'], condition=everyNthRound(5))])
+    """
+
+    def __init__(self, nodes, releaseAfter=None):
+        """
+        :param nodes: the PipelineNodes, raises NutchException if a name is repeated, a job type or a
+         dependency is unknown, or the dependencies have a cycle
+        :param releaseAfter: the name of the node after which the next round may start in a pipelined crawl
+         (see CrawlClient maxOverlap), by default the first UPDATEDB node
+        """
+        self.nodes = list(nodes)
+        self.byName = dict((node.name, node) for node in self.nodes)
+        if len(self.byName) != len(self.nodes):
+            raise NutchException("Pipeline node names must be unique")
+        for node in self.nodes:
+            if node.jobType not in LegalJobs:
+                raise NutchException("Unrecognized job type {} in pipeline node {}".format(node.jobType, node.name))
+            for name in node.after:
+                if name not in self.byName:
+                    raise NutchException("Pipeline node {} depends on unknown node {}".format(node.name, name))
+        if releaseAfter is None:
+            releaseAfter = next((node.name for node in self.nodes if node.jobType == 'UPDATEDB'), None)
+        elif releaseAfter not in self.byName:
+            raise NutchException("Unknown pipeline node {}".format(releaseAfter))
+        self.releaseAfter = releaseAfter
+        self.order = self._sort()
+
+    @classmethod
+    def linear(cls, jobTypes):
+        """:return: a Pipeline running jobTypes one after the other"""
+        nodes = []
+        for jobType in jobTypes:
+            nodes.append(PipelineNode(jobType.lower(), after=[nodes[-1].name] if nodes else ()))
+        return cls(nodes)
+
+    @classmethod
+    def default(cls, index=True):
+        """:return: the classic round GENERATE -> FETCH -> PARSE -> UPDATEDB -> INVERTLINKS -> DEDUP [-> INDEX]"""
+        return cls.linear(RoundJobs + (['INDEX'] if index else []))
+
+    def _sort(self):
+        """:return: the nodes in dependency order, raise NutchException on a cycle"""
+        order = []
+        done = set()
+        remaining = list(self.nodes)
+        while remaining:
+            ready = [node for node in remaining if all(name in done for name in node.after)]
+            if not ready:
+                raise NutchException("Pipeline has a dependency cycle between {}".format(
+                    ', '.join(node.name for node in remaining)))
+            order.extend(ready)
+            done.update(node.name for node in ready)
+            remaining = [node for node in remaining if node.name not in done]
+        return order
+
+    def ready(self, done, started):
+        """
+        :param done: the names of the nodes done (finished or skipped)
+        :param started: the names of the nodes started, including done ones
+        :return: the nodes not started yet whose predecessors are all done, in dependency order
+        """
+        return [node for node in self.order
+                if node.name not in started and all(name in done for name in node.after)]
+
+
+class CrawlEvent(object):
+    """
+    A transition of a crawl, see CrawlClient.events and CrawlClient.addCallback
+
+    type is one of the constants below.  Job events carry the job and its PhaseTiming, ROUND events the
+    RoundReport of the completed round, and STATS events the crawldb statistics just fetched.
+    """
+
+    SUBMITTED = 'submitted'
+    STARTED = 'started'
+    FINISHED = 'finished'
+    FAILED = 'failed'
+    ROUND = 'round'
+    STATS = 'stats'
+    Types = (SUBMITTED, STARTED, FINISHED, FAILED, ROUND, STATS)
+
+    def __init__(self, type, crawlId, round, job=None, timing=None, state=None, report=None, stats=None):
+        self.type = type
+        self.crawlId = crawlId
+        self.round = round
+        self.job = job
+        self.timing = timing
+        self.state = state
+        self.report = report
+        self.stats = stats
+        self.time = time()
+
+    def __repr__(self):
+        if self.job is not None:
+            return "CrawlEvent(%s, round=%d, job=%s)" % (self.type, self.round, self.job.id)
+        return "CrawlEvent(%s, round=%d)" % (self.type, self.round)
+
+    def toDict(self):
+        return {'type': self.type, 'crawlId': self.crawlId, 'round': self.round, 'time': self.time,
+                'jobId': self.job.id if self.job is not None else None,
+                'jobType': self.job.type if self.job is not None else None, 'state': self.state,
+                'report': self.report.toDict() if self.report is not None else None, 'stats': self.stats}
+
+
+class CrawlCheckpoint(object):
+    """
+    A JSON file holding the state of a CrawlClient, see CrawlClient.resume
+
+    Each save writes a temporary file next to it and renames it over the previous one, so a crash never leaves
+    a partial checkpoint behind.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def save(self, state):
+        tmpPath = self.path + '.tmp'
+        with open(tmpPath, 'w') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        replace(tmpPath, self.path)
+
+    def load(self):
+        with open(self.path) as f:
+            return json.load(f)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+
+class CrawlRound(object):
+    """
+    Scheduling state of a round of a CrawlClient: the pipeline nodes started and done, and the running jobs
+    """
+
+    def __init__(self, round, report):
+        self.round = round
+        self.report = report
+        self.started = set()
+        self.done = set()
+        self.running = 0
+
+
+class CrawlClient(object):
+    def __init__(self, server, seed, jobClient, rounds, index, polling=None, roundStats=False, pipeline=None,
+                 maxOverlap=0, checkpoint=None):
+        """Nutch Crawl manager
+
+        High-level Nutch client for managing crawls.
+
+        When this client is initialized, the seedList will automatically be injected.  seed may also be a list of
+        Seeds (see SeedClient.createStream), which are injected one after the other.  Each round then runs the jobs
+        of the pipeline, starting every job whose predecessors are done at once.
+        There are three ways to proceed from here.
+
+        progress() - checks the status of the current jobs, start the jobs that became ready, and return immediately
+        nextRound() - wait and start jobs until the current round is finished and return
+        waitAll() - wait and start jobs until all rounds are finished and return
+
+        It is recommended to use progress() in a while loop for any applications that need to remain interactive,
+        waiting pollDelay() seconds between two calls.
+
+        :param index: whether the default pipeline ends with an INDEX job, ignored if a pipeline is given
+        :param polling: strategy deciding how long to wait between two checks of the current jobs,
+         by default an AdaptivePolling
+        :param roundStats: whether to fetch the crawldb statistics (JobClient.stats()) at the start and end of
+         each round for the round reports.  This runs a stats job on the server, so it is off by default
+        :param pipeline: the Pipeline of jobs run in each round, by default Pipeline.default(index)
+        :param maxOverlap: the number of rounds that may run alongside the newest one.  With maxOverlap > 0 the
+         crawl is pipelined: the next round starts as soon as the pipeline.releaseAfter node (UPDATEDB by default)
+         of the newest round is done, so its GENERATE and FETCH overlap with INVERTLINKS, DEDUP and INDEX of the
+         previous one.  Check that your Nutch version tolerates DEDUP and GENERATE on the same crawldb at once,
+         or release after DEDUP.  By default rounds run one after the other.
+        :param checkpoint: a CrawlCheckpoint, or the name of its file, where the state of the crawl is saved after
+         every transition; see resume()
+
+        requestCount holds the number of REST calls (job creations and job status checks) issued by this client.
+        completedJobs holds the jobs finished so far, in the order they finished.
+        roundReports holds a RoundReport for each round started so far, with the timing of every job; see
+        writeRoundReportsCsv and writeRoundReportsJson to export them.
+        """
+        self._setup(server, jobClient, rounds, index, polling, roundStats, pipeline, maxOverlap, checkpoint)
+
+        # dispatch injection
+        seeds = list(seed) if isinstance(seed, (list, tuple)) else [seed]
+        self._pendingSeeds = seeds[1:]
+        self._startRound()
+        self._inject(seeds[0])
+        self._save()
+
+    def _setup(self, server, jobClient, rounds, index, polling, roundStats, pipeline, maxOverlap, checkpoint):
+        self.server = jobClient.server if isinstance(server, ServerPool) else server
         self.jobClient = jobClient
         self.crawlId = jobClient.crawlId
         self.currentRound = 1
         self.totalRounds = rounds
-        self.currentJob = None
-        self.sleepTime = 1
+        self.polling = polling if polling else AdaptivePolling()
         self.enable_index = index
+        self.pipeline = pipeline if pipeline else Pipeline.default(index)
+        self.roundStats = roundStats
+        self.roundReports = []
+        self.completedJobs = []
+        self.maxOverlap = maxOverlap
+        self.checkpoint = CrawlCheckpoint(checkpoint) if isinstance(checkpoint, string_types) else checkpoint
+        self.requestCount = 0
+        self.finishedRound = 0
+        self._jobIds = set()
+        self._submitting = None
+        self._orphans = []
+        self._pendingSeeds = []
+        self._running = []
+        self._rounds = []
+        self._nodes = {}
+        self._phases = {}
+        self._seeds = {}
+        self._injecting = True
+        self._callbacks = []
+
+    @classmethod
+    def resume(cls, checkpoint, server=None, polling=None, pipeline=None, poller=None, roundStats=False,
+               scheduler=None):
+        """
+        Rebuild a crawl from its checkpoint, and continue from where it was
+
+        The jobs running when the checkpoint was saved are looked up in the jobs of the server: the ones it still
+        knows are watched again, whatever their state, and the ones it lost (e.g. after a restart of the
+        server) are submitted again.  Nothing that was finished is run again.
+
+        :param checkpoint: a CrawlCheckpoint or the name of its file, which keeps being updated
+        :param server: the Server or ServerPool of the crawl, by default a Server for the endpoint saved in the
+         checkpoint
+        :param polling: the polling strategy, see CrawlClient
+        :param pipeline: the Pipeline of the crawl, needed if it was not the default one
+        :param poller: the JobPoller of the new JobClient
+        :param roundStats: whether the round reports include crawldb statistics, see CrawlClient
+        :param scheduler: the JobScheduler of the new JobClient, the jobs watched again count against its caps
+        :return: the CrawlClient, whose roundReports only cover the rounds from the restart
+        """
+        checkpoint = CrawlCheckpoint(checkpoint) if isinstance(checkpoint, string_types) else checkpoint
+        state = checkpoint.load()
+        if server is None:
+            server = Server(state['serverEndpoint'])
+        jobServer = server
+        if isinstance(server, ServerPool):
+            jobServer = [member for member in server.servers if member.serverEndpoint == state['serverEndpoint']][0]
+            server.pin(state['crawlId'], jobServer)
+        jobClient = JobClient(server, state['crawlId'], state['confId'], poller=poller, scheduler=scheduler)
+
+        crawl = cls.__new__(cls)
+        crawl._setup(jobServer, jobClient, state['totalRounds'], state['index'], polling, roundStats, pipeline,
+                     state['maxOverlap'], checkpoint)
+        crawl.currentRound = state['currentRound']
+        crawl.finishedRound = state.get('finishedRound', 0)
+        crawl._injecting = state['injecting']
+        crawl._pendingSeeds = [Seed(seed['id'], seed['seedPath'], jobServer) for seed in state['pendingSeeds']]
+        rounds = {}
+        for saved in state['rounds']:
+            crawlRound = CrawlRound(saved['round'], RoundReport(saved['round']))
+            crawlRound.started.update(saved['started'])
+            crawlRound.done.update(saved['done'])
+            crawl.roundReports.append(crawlRound.report)
+            crawl._rounds.append(crawlRound)
+            rounds[crawlRound.round] = crawlRound
+
+        crawl.requestCount += 1
+        listed = jobClient.list()
+        known = set(job.id for job in listed)
+        # jobs that were being submitted when the driver died, before the checkpoint had their id: adopted
+        # instead of being submitted again when their pipeline node becomes ready
+        crawl._jobIds = set(state.get('jobIds', ()))
+        submitting = state.get('submitting', ())
+        crawl._orphans = [job for job in listed if job.id not in crawl._jobIds and job.type in submitting]
+        for saved in state['running']:
+            crawlRound = rounds[saved['round']]
+            node = crawl.pipeline.byName[saved['node']] if saved['node'] else None
+            if saved['id'] not in known:
+                log.warning('Job %s of crawl %s is unknown to the server, submitting it again', saved['id'],
+                            crawl.crawlId)
+                if node is None:
+                    crawl._pendingSeeds.insert(0, Seed(saved['seed']['id'], saved['seed']['seedPath'], jobServer))
+                else:
+                    crawlRound.started.discard(node.name)
+                continue
+            job = Job(saved['id'], jobServer, poller, saved['type'])
+            if scheduler is not None:
+                scheduler.adopt(job, crawl.crawlId)
+            crawl._track(job, crawlRound, node, saved['submitted'])
+            if node is None:
+                crawl._seeds[id(job)] = Seed(saved['seed']['id'], saved['seed']['seedPath'], jobServer)
+        crawl._schedule(nextRound=False)
+        crawl._save()
+        return crawl
+
+    @property
+    def currentJob(self):
+        """The first of the running jobs, or None if no jobs are running"""
+        return self._running[0] if self._running else None
+
+    @property
+    def currentJobs(self):
+        """The running jobs, in the order they were started"""
+        return list(self._running)
+
+    @property
+    def sleepTime(self):
+        """Seconds between two polls if a FixedPolling is used, setting it switches to a FixedPolling"""
+        return getattr(self.polling, 'interval', None)
+
+    @sleepTime.setter
+    def sleepTime(self, value):
+        self.polling = FixedPolling(value)
+
+    def _submit(self, crawlRound, node):
+        job = self._adopt(node.jobType)
+        if job is None:
+            self._beforeCreate(node.jobType)
+            job = self.jobClient.create(node.jobType, **node.args)
+            self._submitting = None
+        self._track(job, crawlRound, node)
+        crawlRound.started.add(node.name)
+        return job
 
-        # dispatch injection
-        self.currentJob = self.jobClient.inject(seed)
+    def _inject(self, seed):
+        job = self._adopt('INJECT')
+        if job is None:
+            self._beforeCreate('INJECT')
+            job = self.jobClient.inject(seed)
+            self._submitting = None
+        self._track(job, self._rounds[0], None)
+        self._seeds[id(job)] = seed
+        return job
+
+    def _beforeCreate(self, jobType):
+        """Record in the checkpoint that a jobType job is about to be created, so a resume can find it"""
+        self.requestCount += 1
+        self._submitting = jobType
+        self._save()
+
+    def _adopt(self, jobType):
+        """:return: a job of jobType submitted by a previous driver after its last checkpoint, or None"""
+        for job in self._orphans:
+            if job.type == jobType:
+                self._orphans.remove(job)
+                log.info('Adopting %s job %s of crawl %s, submitted after the last checkpoint was saved',
+                         jobType, job.id, self.crawlId)
+                if self.jobClient.scheduler is not None:
+                    self.jobClient.scheduler.adopt(job, self.crawlId)
+                return job
+        return None
+
+    def _track(self, job, crawlRound, node, submitted=None):
+        phase = PhaseTiming(job, crawlRound.round, submitted if submitted else time())
+        self._phases[id(job)] = phase
+        self._nodes[id(job)] = (crawlRound, node)
+        crawlRound.report.phases.append(phase)
+        crawlRound.running += 1
+        self._running.append(job)
+        self._emit(CrawlEvent.SUBMITTED, crawlRound.round, job=job, timing=phase)
+        return job
 
-    def _nextJob(self, job, nextRound=True):
+    def addCallback(self, callback, eventTypes=None):
         """
-        Given a completed job, start the next job in the round, or return None
+        Call callback(event) with each CrawlEvent of this crawl, as it happens
 
-        :param nextRound: whether to start jobs from the next round if the current round is completed.
-        :return: the newly started Job, or None if no job was started
-        """
-
-        jobInfo = job.info()
-        assert jobInfo['state'] == 'FINISHED'
-
-        roundEnd = False
-        if jobInfo['type'] == 'INJECT':
-            nextCommand = 'GENERATE'
-        elif jobInfo['type'] == 'GENERATE':
-            nextCommand = 'FETCH'
-        elif jobInfo['type'] == 'FETCH':
-            nextCommand = 'PARSE'
-        elif jobInfo['type'] == 'PARSE':
-            nextCommand = 'UPDATEDB'
-        elif jobInfo['type'] == 'UPDATEDB':
-            nextCommand = 'INVERTLINKS'
-        elif jobInfo['type'] == 'INVERTLINKS':
-            nextCommand = 'DEDUP'
-        elif jobInfo['type'] == 'DEDUP':
-            if self.enable_index:
-                nextCommand = 'INDEX'
-            else:
-                roundEnd = True
-        elif jobInfo['type'] == 'INDEX':
-            roundEnd = True
-        else:
-            raise NutchException("Unrecognized job type {}".format(jobInfo['type']))
+        Callbacks run in the thread driving the crawl, and exceptions they raise are logged and ignored.
 
-        if roundEnd:
-            if nextRound and self.currentRound < self.totalRounds:
-                nextCommand = 'GENERATE'
-                self.currentRound += 1
-            else:
-                return None
+        :param eventTypes: the CrawlEvent types to receive, by default all of them
+        :return: callback, to pass to removeCallback
+        """
+        self._callbacks.append((callback, frozenset(eventTypes) if eventTypes else None))
+        return callback
+
+    def removeCallback(self, callback):
+        self._callbacks = [(registered, types) for registered, types in self._callbacks if registered is not callback]
+
+    def _emit(self, eventType, round, **fields):
+        if not self._callbacks:
+            return
+        event = CrawlEvent(eventType, self.crawlId, round, **fields)
+        for callback, types in list(self._callbacks):
+            if types is None or eventType in types:
+                try:
+                    callback(event)
+                except Exception:
+                    log.exception('Crawl event callback failed on %r', event)
+
+    def events(self, nextRound=True):
+        """
+        Drive the crawl and yield its CrawlEvents as they happen
 
-        return self.jobClient.create(nextCommand)
+        The generator calls progress() and waits pollDelay() seconds (or for the JobPoller) in turn, and
+        ends when no jobs are running.  Jobs finishing between two polls are never seen STARTED.
+        If a job fails, its FAILED event is yielded and the NutchCrawlException is raised.
 
-    def progress(self, nextRound=True):
+        :param nextRound: whether to continue with the next rounds, or stop at the end of the current one
         """
-        Check the status of the current job, activate the next job if it's finished, and return the active job
+        events = collections.deque()
+        self.addCallback(events.append)
+        try:
+            while True:
+                error = None
+                try:
+                    activeJob = self.progress(nextRound)
+                except NutchCrawlException as e:
+                    error = e
+                while events:
+                    yield events.popleft()
+                if error is not None:
+                    raise error
+                if activeJob is None:
+                    return
+                self._wait()
+        finally:
+            self.removeCallback(events.append)
+
+    def _stats(self):
+        if not self.roundStats:
+            return None
+        self.requestCount += 1
+        try:
+            stats = self.jobClient.stats()
+        except NutchException as e:
+            # there is no crawldb before the first injection
+            log.debug("No crawldb statistics for %s: %s", self.crawlId, e)
+            stats = {}
+        self._emit(CrawlEvent.STATS, self.currentRound, stats=stats)
+        return stats
+
+    def _startRound(self):
+        crawlRound = CrawlRound(self.currentRound, RoundReport(self.currentRound, self._stats()))
+        self.roundReports.append(crawlRound.report)
+        self._rounds.append(crawlRound)
+
+    def _endRound(self, crawlRound):
+        crawlRound.report.finished = time()
+        crawlRound.report.statsAfter = self._stats()
+        self._rounds.remove(crawlRound)
+        self.finishedRound = max(self.finishedRound, crawlRound.round)
+        if self.finishedRound >= self.totalRounds and self.jobClient.pool is not None:
+            # the crawl is over, let the pool forget its server
+            self.jobClient.pool.release(self.crawlId)
+        self._emit(CrawlEvent.ROUND, crawlRound.round, report=crawlRound.report)
+
+    def _canStartRound(self):
+        """:return: whether a new round may start now"""
+        if self.currentRound >= self.totalRounds:
+            return False
+        if not self._rounds:
+            return True
+        releaseAfter = self.pipeline.releaseAfter
+        return (len(self._rounds) <= self.maxOverlap and releaseAfter is not None
+                and releaseAfter in self._rounds[-1].done)
+
+    def _startNextRound(self):
+        """
+        Start the jobs of the first round that has not finished
 
-        If the current job has failed, a NutchCrawlException will be raised with no jobs attached.
+        :return: False if all rounds are finished, and nothing was started
+        """
+        self.currentRound = max(self.currentRound, self.finishedRound + 1)
+        if self.currentRound > self.totalRounds:
+            return False
+        self._startRound()
+        self._schedule(nextRound=False)
+        self._save()
+        return True
+
+    def _roundsLeft(self):
+        """:return: whether jobs are running, or rounds remain to be run"""
+        return bool(self._running) or max(self.currentRound, self.finishedRound + 1) <= self.totalRounds
+
+    def _beginRounds(self):
+        """
+        Start the next round if no jobs are running, before waiting for the running rounds with progress()
 
-        :param nextRound: whether to start jobs from the next round if the current job/round is completed.
-        :return: the currently running Job, or None if no jobs are running.
+        :return: the mark to pass to _endRounds, or None if all rounds are finished
         """
+        completed = len(self.completedJobs)
+        firstRound = self._rounds[0].round if self._rounds else max(self.currentRound, self.finishedRound + 1)
+        if not self._running and not self._startNextRound():
+            return None
+        return completed, firstRound
 
-        currentJob = self.currentJob
-        if currentJob is None:
-            return currentJob
+    def _endRounds(self, mark, byRound=False):
+        """
+        Move currentRound past the finished rounds, and save the checkpoint, once progress() returned None
 
-        jobInfo = currentJob.info()
+        :param mark: the result of _beginRounds
+        :param byRound: whether to group the completed jobs by round
+        :return: the jobs completed since _beginRounds, as a list, or a list of lists if byRound
+        """
+        completed, firstRound = mark
+        self.currentRound = self.finishedRound + 1
+        self._save()
+        jobs = self.completedJobs[completed:]
+        return self._byRound(jobs, firstRound) if byRound else jobs
+
+    def _state(self):
+        """:return: the state of the crawl saved in checkpoints, as a JSON-serializable dict"""
+        seed = lambda seed: {'id': seed.id, 'seedPath': seed.seedPath}
+        running = []
+        for job in self._running:
+            crawlRound, node = self._nodes[id(job)]
+            running.append({'id': job.id, 'type': job.type, 'round': crawlRound.round,
+                            'node': node.name if node else None, 'submitted': self._phases[id(job)].submitted,
+                            'seed': seed(self._seeds[id(job)]) if id(job) in self._seeds else None})
+        return {
+            'crawlId': self.crawlId, 'confId': self.jobClient.confId, 'serverEndpoint': self.server.serverEndpoint,
+            'currentRound': self.currentRound, 'finishedRound': self.finishedRound, 'totalRounds': self.totalRounds,
+            'index': self.enable_index,
+            'maxOverlap': self.maxOverlap, 'injecting': self._injecting,
+            'pendingSeeds': [seed(pending) for pending in self._pendingSeeds],
+            'rounds': [{'round': crawlRound.round, 'started': sorted(crawlRound.started),
+                        'done': sorted(crawlRound.done)} for crawlRound in self._rounds],
+            'running': running, 'savedAt': time(),
+            'jobIds': sorted(self._jobIds | set(job.id for job in self._running if job.id is not None)),
+            'submitting': sorted(set([self._submitting] if self._submitting else []) |
+                                 set(job.type for job in self._running if job.id is None)),
+        }
 
-        if jobInfo['state'] == 'RUNNING':
-            return currentJob
-        elif jobInfo['state'] == 'FINISHED':
-            nextJob = self._nextJob(currentJob, nextRound)
-            self.currentJob = nextJob
-            return nextJob
-        else:
-            error = NutchCrawlException("Unexpected job state: {}".format(jobInfo['state']))
-            error.current_job = currentJob
-            raise NutchCrawlException
+    def _save(self):
+        if self.checkpoint is not None:
+            self.checkpoint.save(self._state())
+
+    def _schedule(self, nextRound):
+        """
+        Start the jobs that are ready: the next seed to inject, or the pipeline nodes whose predecessors are done
+
+        :param nextRound: whether to start the next round if the current round is completed.
+        """
+        if self._injecting:
+            if self._running:
+                return
+            if self._pendingSeeds:
+                self._inject(self._pendingSeeds.pop(0))
+                return
+            self._injecting = False
+
+        while True:
+            progressed = False
+            for crawlRound in list(self._rounds):
+                ready = self.pipeline.ready(crawlRound.done, crawlRound.started)
+                for node in ready:
+                    if node.condition is not None and not node.condition(crawlRound.round, self):
+                        crawlRound.started.add(node.name)
+                        crawlRound.done.add(node.name)
+                    else:
+                        self._submit(crawlRound, node)
+                # skipped nodes may have made others ready
+                progressed = progressed or bool(ready)
+                if not crawlRound.running and len(crawlRound.done) == len(self.pipeline.nodes):
+                    self._endRound(crawlRound)
+            if progressed:
+                continue
+            if not nextRound or not self._canStartRound():
+                return
+            self.currentRound += 1
+            self._startRound()
+
+    def pollDelay(self):
+        """
+        :return: the number of seconds to wait before checking the current jobs again
+        """
+        if not self._running:
+            return self.polling.delay(None, 0)
+        now = time()
+        return min(self.polling.delay(job.type, now - self._phases[id(job)].submitted) for job in self._running)
+
+    def progress(self, nextRound=True):
+        """
+        Check the status of the running jobs, start the jobs that became ready, and return the current job
+
+        Each call fetches the state of each running job once.
+        If a job has failed, a NutchCrawlException will be raised with that job attached as current_job.
+
+        :param nextRound: whether to start jobs from the next round if the current round is completed.
+        :return: the currently running Job (see currentJobs for all of them), or None if no jobs are running.
+        """
+
+        if not self._running:
+            return None
+
+        changed = False
+        for job in list(self._running):
+            self.requestCount += 1
+            jobInfo = job.info()
+            now = time()
+            phase = self._phases[id(job)]
+            wasStarted, wasFinished = phase.started is not None, phase.finished is not None
+            phase.observe(jobInfo['state'], now)
+            round = self._nodes[id(job)][0].round
+            if phase.started is not None and not wasStarted:
+                self._emit(CrawlEvent.STARTED, round, job=job, timing=phase, state=jobInfo['state'])
+            if jobInfo['state'] in ('IDLE', 'RUNNING'):
+                continue
+
+            duration = now - phase.submitted
+            if not wasFinished:
+                # a failed job stays running, and is seen again by every later call
+                self.server.clientMetrics.observeJob(job.type, jobInfo['state'], duration)
+            if jobInfo['state'] != 'FINISHED':
+                if not wasFinished:
+                    self._emit(CrawlEvent.FAILED, round, job=job, timing=phase, state=jobInfo['state'])
+                error = NutchCrawlException("Unexpected job state: {}".format(jobInfo['state']))
+                error.current_job = job
+                raise error
+            self._emit(CrawlEvent.FINISHED, round, job=job, timing=phase, state=jobInfo['state'])
+            self.polling.observe(job.type, duration)
+            self._running.remove(job)
+            del self._phases[id(job)]
+            crawlRound, node = self._nodes.pop(id(job))
+            crawlRound.running -= 1
+            if node is not None:
+                crawlRound.done.add(node.name)
+            self._seeds.pop(id(job), None)
+            self.completedJobs.append(job)
+            self._jobIds.add(job.id)
+            changed = True
+
+        if changed:
+            self._schedule(nextRound)
+            self._save()
+        return self.currentJob
 
     def addRounds(self, numRounds=1):
         """
@@ -568,6 +2783,7 @@ class CrawlClient():
         """
 
         self.totalRounds += numRounds
+        self._save()
         return self.totalRounds
 
     def nextRound(self):
@@ -577,22 +2793,30 @@ class CrawlClient():
         If a job fails, a NutchCrawlException will be raised, with all completed jobs from this round attached
         to the exception.
 
-        :return: a list of all completed Jobs
+        :return: a list of all completed Jobs, in the order they finished, empty if all rounds are finished
         """
 
-        finishedJobs = []
-        if self.currentJob is None:
-            self.currentJob = self.jobClient.create('GENERATE')
-
-        activeJob = self.progress(nextRound=False)
-        while activeJob:
-            oldJob = activeJob
-            activeJob = self.progress(nextRound=False)  # updates self.currentJob
-            if oldJob and oldJob != activeJob:
-                finishedJobs.append(oldJob)
-            sleep(self.sleepTime)
-        self.currentRound += 1
-        return finishedJobs
+        mark = self._beginRounds()
+        if mark is None:
+            return []
+
+        while True:
+            try:
+                activeJob = self.progress(nextRound=False)
+            except NutchCrawlException as e:
+                e.completed_jobs = self.completedJobs[mark[0]:]
+                raise
+            if activeJob is None:
+                break
+            self._wait()
+        return self._endRounds(mark)
+
+    def _wait(self):
+        """Wait pollDelay() seconds, or until the next tick of the JobPoller"""
+        if self.jobClient.poller and self.jobClient.poller.running:
+            self.jobClient.poller.wait(self.pollDelay())
+        else:
+            sleep(self.pollDelay())
 
     def waitAll(self):
         """
@@ -604,16 +2828,170 @@ class CrawlClient():
         :return: a list of jobs completed for each round, organized by round (list-of-lists)
         """
 
-        finishedRounds = [self.nextRound()]
+        if self.maxOverlap:
+            return self._waitPipelined()
 
-        while self.currentRound < self.totalRounds:
-            finishedRounds.append(self.nextRound())
+        finishedRounds = []
+        try:
+            while self._roundsLeft():
+                finishedRounds.append(self.nextRound())
+        except NutchCrawlException as e:
+            e.completed_jobs = [job for jobs in finishedRounds for job in jobs] + e.completed_jobs
+            raise
+
+        return finishedRounds
 
+    def _waitPipelined(self):
+        """waitAll for a pipelined crawl: run progress() until all rounds are done, letting rounds overlap"""
+
+        mark = self._beginRounds()
+        if mark is None:
+            return []
+        try:
+            while self.progress() is not None:
+                self._wait()
+        except NutchCrawlException as e:
+            e.completed_jobs = self.completedJobs[mark[0]:]
+            raise
+        return self._endRounds(mark, byRound=True)
+
+    def _byRound(self, jobs, firstRound):
+        """:return: jobs as a list of lists, one for each round from firstRound to the last completed one"""
+        rounds = dict((id(phase.job), phase.round) for report in self.roundReports for phase in report.phases)
+        finishedRounds = [[] for round in range(firstRound, self.currentRound)]
+        for job in jobs:
+            finishedRounds[rounds[id(job)] - firstRound].append(job)
         return finishedRounds
 
 
+def hostOf(url):
+    """
+    :return: the lower-cased host name of url, URLs without a scheme are assumed to be http
+    """
+    if '://' not in url:
+        url = 'http://' + url
+    return (urlsplit(url).hostname or '').lower()
+
+
+class HashRing(object):
+    """
+    Consistent hashing of keys onto a fixed number of shards
+
+    Each shard owns `replicas` points on the ring, so keys are spread evenly and most keys keep their
+    shard when the number of shards changes.
+    """
+
+    def __init__(self, shards, replicas=100):
+        points = sorted((self._hash('%d:%d' % (shard, replica)), shard)
+                        for shard in range(shards) for replica in range(replicas))
+        self._keys = [point for point, shard in points]
+        self._shards = [shard for point, shard in points]
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(key.encode('utf-8')).hexdigest()[:16], 16)
+
+    def shardFor(self, key):
+        """:return: the shard (0 <= shard < shards) owning key"""
+        return self._shards[bisect(self._keys, self._hash(key)) % len(self._keys)]
+
+
+def shardSeeds(urls, shards):
+    """
+    Partition seed URLs by host, keeping every host in a single shard
+
+    :param urls: an iterable of URLs
+    :param shards: the number of shards
+    :return: a list of `shards` lists of URLs
+    """
+    ring = HashRing(shards)
+    partitions = [[] for shard in range(shards)]
+    for url in urls:
+        partitions[ring.shardFor(hostOf(url))].append(url)
+    return partitions
+
+
+def spillShardSeeds(urls, shards, directory):
+    """
+    Partition seed URLs by host like shardSeeds, writing each shard to a file instead of keeping it in memory
+
+    :param urls: an iterable of URLs, consumed lazily
+    :param shards: the number of shards
+    :param directory: the directory to write the files 'shard<i>.txt' to, one URL per line
+    :return: a list of `shards` (file name, number of URLs) pairs
+    """
+    ring = HashRing(shards)
+    names = [os.path.join(directory, 'shard%05d.txt' % shard) for shard in range(shards)]
+    counts = [0] * shards
+    files = [open(name, 'w') for name in names]
+    try:
+        for url in urls:
+            shard = ring.shardFor(hostOf(url))
+            files[shard].write(url + '\n')
+            counts[shard] += 1
+    finally:
+        for f in files:
+            f.close()
+    return list(zip(names, counts))
+
+
+class ShardedCrawlClient(object):
+    """
+    Aggregate handle on the crawls launched by Nutch.ShardedCrawl, one per seed shard
+    """
+
+    def __init__(self, crawls):
+        """
+        :param crawls: the CrawlClient of each shard
+        """
+        self.crawls = crawls
+
+    @property
+    def currentJobs(self):
+        """:return: the running Jobs of all shards"""
+        return [job for crawl in self.crawls for job in crawl.currentJobs]
+
+    def addRounds(self, numRounds=1):
+        """Add rounds to every shard, see CrawlClient.addRounds"""
+        for crawl in self.crawls:
+            crawl.addRounds(numRounds)
+
+    def progress(self):
+        """
+        Call progress() on every shard still crawling, starting the next round of a shard when it completes one
+
+        :return: the currently running Jobs, empty when all shards are done
+        """
+        for crawl in self.crawls:
+            crawl.progress()
+        return self.currentJobs
+
+    def waitAll(self):
+        """
+        Execute all queued rounds of every shard and return when they have finished.
+
+        :return: the list of jobs completed by each shard, in the order of self.crawls
+        """
+
+        completed = [len(crawl.completedJobs) for crawl in self.crawls]
+        while True:
+            for crawl in self.crawls:
+                crawl.progress()
+            active = [crawl for crawl in self.crawls if crawl.currentJob is not None]
+            if not active:
+                return [crawl.completedJobs[start:] for crawl, start in zip(self.crawls, completed)]
+            delay = min(crawl.pollDelay() for crawl in active)
+            pollers = [crawl.jobClient.poller for crawl in active
+                       if crawl.jobClient.poller and crawl.jobClient.poller.running]
+            if pollers:
+                pollers[0].wait(delay)
+            else:
+                sleep(delay)
+
+
 class Nutch:
-    def __init__(self, confId=DefaultConfig, serverEndpoint=DefaultServerEndpoint, raiseErrors=True, **args):
+    def __init__(self, confId=DefaultConfig, serverEndpoint=DefaultServerEndpoint, raiseErrors=True, server=None,
+                 scheduler=None, **args):
         '''
         Nutch client for interacting with a Nutch instance over its REST API.
 
@@ -626,6 +3004,10 @@ class Nutch:
         confID - The name of the default configuration file to use, by default: nutch.DefaultConfig
         serverEndpoint - The location of the Nutch server, by default: nutch.DefaultServerEndpoint
         raiseErrors - raise exceptions if server response is not 200
+        server - an existing Server to use instead of creating one from serverEndpoint and raiseErrors,
+                 e.g. to tune its connection pool, or a ServerPool.  All clients created by this object share it.
+        scheduler - a JobScheduler all job submissions of the JobClients created by this object go through,
+                    to cap the jobs running on each server.  Several Nutch objects may share one.
 
         Provides functions:
             server - getServerStatus, stopServer
@@ -643,27 +3025,39 @@ class Nutch:
         '''
 
         self.confId = confId
-        self.server = Server(serverEndpoint, raiseErrors)
+        self.server = server if server else Server(serverEndpoint, raiseErrors)
+        self.scheduler = scheduler
         self.config = ConfigClient(self.server)[self.confId]
         self.job_parameters = dict()
         self.job_parameters['confId'] = confId
         self.job_parameters['args'] = args     # additional config. args as a dictionary
 
         # if the configuration doesn't contain a user agent, set a default one.
-        if 'http.agent.name' not in self.config.info():
+        if 'http.agent.name' not in self.config:
             self.config['http.agent.name'] = DefaultUserAgent
 
-    def Jobs(self, crawlId=None):
+    def Jobs(self, crawlId=None, poller=None):
         """
         Create a JobClient for listing and creating jobs.
         The JobClient inherits the confId from the Nutch client.
 
         :param crawlId: crawlIds to use for this client.  If not provided, will be generated
          by nutch.defaultCrawlId()
+        :param poller: a JobPoller to read job states from, see JobPoller()
         :return: a JobClient
         """
         crawlId = crawlId if crawlId else defaultCrawlId()
-        return JobClient(self.server, crawlId, self.confId)
+        return JobClient(self.server, crawlId, self.confId, poller=poller, scheduler=self.scheduler)
+
+    def JobPoller(self, interval=DefaultPollInterval):
+        """
+        Create and start a JobPoller that refreshes the state of all jobs with one request per interval.
+        Pass it to Jobs() or Crawl() to let many crawls share it.
+
+        :param interval: seconds between two polls
+        :return: a running JobPoller, call stop() when done
+        """
+        return JobPoller(self.server, interval).start()
 
     def Config(self):
         return self.config
@@ -674,23 +3068,85 @@ class Nutch:
     def Seeds(self):
         return SeedClient(self.server)
 
-    def Crawl(self, seed, seedClient=None, jobClient=None, rounds=1, index=True):
+    def Crawl(self, seed, seedClient=None, jobClient=None, rounds=1, index=True, poller=None, polling=None,
+              roundStats=False, pipeline=None, maxOverlap=0, checkpoint=None):
         """
         Launch a crawl using the given seed
-        :param seed: Type (Seed or SeedList) - used for crawl
+        :param seed: Type (Seed, list of Seeds or SeedList) - used for crawl
         :param seedClient: if a SeedList is given, the SeedClient to upload, if None a default will be created
         :param jobClient: the JobClient to be used, if None a default will be created
         :param rounds: the number of rounds in the crawl
+        :param poller: the JobPoller used by the default JobClient
+        :param polling: the polling strategy of the crawl, see CrawlClient
+        :param roundStats: whether the round reports include crawldb statistics, see CrawlClient
+        :param pipeline: the Pipeline of jobs run in each round, see CrawlClient
+        :param maxOverlap: the number of rounds that may overlap the newest one in a pipelined crawl, see CrawlClient
+        :param checkpoint: a CrawlCheckpoint or file name where the state of the crawl is saved, see ResumeCrawl
         :return: a CrawlClient to monitor and control the crawl
         """
-        if seedClient is None:
-            seedClient = self.Seeds()
+        uploaded = type(seed) == Seed or (isinstance(seed, list) and len(seed) > 0 and type(seed[0]) == Seed)
         if jobClient is None:
-            jobClient = self.Jobs()
+            if uploaded:
+                # the crawl must run where the seed list was uploaded
+                server = seed.server if type(seed) == Seed else seed[0].server
+                jobClient = JobClient(server, defaultCrawlId(), self.confId, poller=poller, scheduler=self.scheduler)
+            else:
+                jobClient = self.Jobs(poller=poller)
+        if seedClient is None:
+            seedClient = SeedClient(jobClient.server)
+
+        if not uploaded:
+            sid = jobClient.crawlId + '_seeds'
+            if isinstance(seedClient.server, ServerPool):
+                seedClient.server.pin(sid, jobClient.server)
+            seed = seedClient.create(sid, seed)
+        return CrawlClient(jobClient.server, seed, jobClient, rounds, index, polling, roundStats, pipeline,
+                           maxOverlap, checkpoint)
+
+    def ResumeCrawl(self, checkpoint, poller=None, polling=None, pipeline=None, roundStats=False):
+        """
+        Continue a crawl from its checkpoint, see CrawlClient.resume
+
+        :return: a CrawlClient to monitor and control the crawl
+        """
+        return CrawlClient.resume(checkpoint, self.server, polling, pipeline, poller, roundStats, self.scheduler)
 
-        if type(seed) != Seed:
-            seed = seedClient.create(jobClient.crawlId + '_seeds', seed)
-        return CrawlClient(self.server, seed, jobClient, rounds, index)
+    def ShardedCrawl(self, urls, shards, rounds=1, index=True, crawlId=None, poller=None, polling=None,
+                     chunkSize=DefaultSeedChunkSize):
+        """
+        Split a seed list by host into `shards` crawls, and launch them
+
+        URLs are assigned to shards by consistent hashing of their host, so each host is crawled (and kept
+        polite) by a single crawl.  Shard i uses the crawlId '<crawlId>_<i>'; empty shards are not launched.
+        With a ServerPool, each shard is placed on the least-loaded server.
+        The shards are spilled to temporary files and uploaded with SeedClient.createStream, so memory use does
+        not depend on the number of URLs.
+
+        :param urls: an iterable of seed URLs
+        :param shards: the number of shards
+        :param rounds: the number of rounds in each crawl
+        :param crawlId: prefix of the crawlIds of the shards.  If not provided, will be generated by
+         nutch.defaultCrawlId()
+        :param poller: the JobPoller used by the shards
+        :param polling: the polling strategy shared by the shards, by default a shared AdaptivePolling
+        :param chunkSize: maximum number of URLs per uploaded seed list, see SeedClient.createStream
+        :return: a ShardedCrawlClient to monitor and control all shards
+        """
+        crawlId = crawlId if crawlId else defaultCrawlId()
+        polling = polling if polling else AdaptivePolling()
+        crawls = []
+        directory = tempfile.mkdtemp(prefix='nutch-shards-')
+        try:
+            for shard, (filename, count) in enumerate(spillShardSeeds(urls, shards, directory)):
+                if not count:
+                    continue
+                jobClient = self.Jobs('%s_%d' % (crawlId, shard), poller)
+                seeds = SeedClient(jobClient.server).createStream(jobClient.crawlId + '_seeds',
+                                                                  iterSeedFile(filename), chunkSize)
+                crawls.append(self.Crawl(seeds, jobClient=jobClient, rounds=rounds, index=index, polling=polling))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        return ShardedCrawlClient(crawls)
 
     ## convenience functions
     ## TODO: Decide if any of these should be deprecated.
@@ -704,7 +3160,7 @@ class Nutch:
         return self.Configs().list()
 
     def configGetInfo(self, cid):
-        return self.Configs()[cid].info()
+        return self.Configs()[cid].params()
 
     def configGetParameter(self, cid, parameterId):
         return self.Configs()[cid][parameterId]
@@ -715,7 +3171,7 @@ class Nutch:
 
 def main(argv=None):
     """Run Nutch command using REST API."""
-    global Verbose, Mock
+    global Mock
     if argv is None:
         argv = sys.argv
 
@@ -735,7 +3191,7 @@ def main(argv=None):
         elif opt in ('-s', '--server'):  serverEndpoint = val
         elif opt in ('-p', '--port'):    serverEndpoint = 'http://localhost:%s' % val
         elif opt in ('-m', '--mock'):    Mock = 1
-        elif opt in ('-v', '--verbose'): Verbose = 1
+        elif opt in ('-v', '--verbose'): logging.basicConfig(level=logging.DEBUG)
         else: die(USAGE)
 
     cmd = argv[0]
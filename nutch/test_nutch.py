@@ -15,24 +15,314 @@
 # limitations under the License.
 
 # Test Nutch API
-# Assumes a Nutch REST server is running on localhost
+# Runs against an in-process MockNutchServer, or against the Nutch REST server at $NUTCH_SERVER if set,
+# e.g. NUTCH_SERVER=http://localhost:8081
 # TODO: Package into Travis tests
 
 import nutch
 import pytest
 import glob
+import io
+import itertools
+import json
+import os
+import requests
+import threading
 from time import sleep
 
 slow = pytest.mark.slow
 
+ENDPOINT = os.environ.get('NUTCH_SERVER')
+
+@pytest.fixture(scope='session', autouse=True)
+def nutch_server():
+    global ENDPOINT
+    if os.environ.get('NUTCH_SERVER'):
+        yield None
+        return
+    from nutch.mockserver import MockNutchServer
+    with MockNutchServer() as mock:
+        ENDPOINT = mock.endpoint
+        yield mock
+
 def get_nutch():
-    return nutch.Nutch()
+    return nutch.Nutch(serverEndpoint=ENDPOINT)
 
 
 def test_nutch_constructor():
     nt = get_nutch()
     assert nt
 
+## Server
+
+def test_server_session_per_thread():
+    server = nutch.Server(nutch.nutch.DefaultServerEndpoint, poolMaxSize=4)
+    session = server.session()
+    assert server.session() is session
+
+    other = []
+    t = threading.Thread(target=lambda: other.append(server.session()))
+    t.start()
+    t.join()
+    # each thread has its own session, but all of them share the connection pool
+    assert other[0] is not session
+    assert other[0].get_adapter(server.serverEndpoint) is session.get_adapter(server.serverEndpoint)
+    server.close()
+
+def test_async_server_bounds_in_flight():
+    import asyncio
+    from nutch.aio import AsyncServer
+
+    server = nutch.Server(nutch.nutch.DefaultServerEndpoint)
+    lock = threading.Lock()
+    counts = {'active': 0, 'peak': 0}
+
+    def call(verb, servicePath, **kwargs):
+        with lock:
+            counts['active'] += 1
+            counts['peak'] = max(counts['peak'], counts['active'])
+        sleep(0.01)
+        with lock:
+            counts['active'] -= 1
+        return servicePath
+
+    server.call = call
+    aserver = AsyncServer(server, maxInFlight=3)
+
+    async def run():
+        return await asyncio.gather(*[aserver.call('get', '/job/%d' % i) for i in range(20)])
+
+    assert asyncio.run(run()) == ['/job/%d' % i for i in range(20)]
+    assert counts['peak'] == 3
+    aserver.close()
+
+class FakeResponse(object):
+    def __init__(self, status_code, text='ok', content_type='text/plain'):
+        self.status_code = status_code
+        self.headers = {'content-type': content_type}
+        self.text = text
+        self.content = text.encode('utf-8')
+        self.request = None
+        self.parsed = 0
+
+    def json(self):
+        import json
+        self.parsed += 1
+        return json.loads(self.text)
+
+class FakeSession(object):
+    """Returns the scripted responses (or raises the scripted exceptions) in order"""
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.headers = []
+
+    def request(self, verb, url, **kwargs):
+        self.requests.append((verb, kwargs['timeout']))
+        self.headers.append(kwargs.get('headers'))
+        resp = self.responses.pop(0)
+        if isinstance(resp, Exception):
+            raise resp
+        return resp
+
+def fake_server(session, **kwargs):
+    server = nutch.Server(nutch.nutch.DefaultServerEndpoint, **kwargs)
+    server.session = lambda: session
+    return server
+
+def test_server_retries_idempotent_calls():
+    session = FakeSession(requests.ConnectionError(), FakeResponse(503), FakeResponse(200, 'done'))
+    server = fake_server(session, retryPolicy=nutch.RetryPolicy(backoff=0), timeout=(1, 2))
+    assert server.call('get', '/admin') == 'done'
+    assert session.requests == [('get', (1, 2))] * 3
+
+    # POST is not retried by default
+    session = FakeSession(FakeResponse(503), FakeResponse(200))
+    server = fake_server(session, retryPolicy=nutch.RetryPolicy(backoff=0))
+    with pytest.raises(nutch.NutchException) as e:
+        server.call('post', '/job/create', {'type': 'INJECT'})
+    assert e.value.status_code == 503
+
+def test_server_logging(caplog):
+    import json
+    import logging
+    body = json.dumps([{'id': 'job-%d' % i, 'state': 'RUNNING'} for i in range(1000)])
+
+    resp = FakeResponse(200, body, 'application/json')
+    server = fake_server(FakeSession(resp))
+    with caplog.at_level(logging.INFO, logger='nutch'):
+        assert len(server.call('get', '/job')) == 1000
+    assert not caplog.records
+    assert resp.parsed == 1
+
+    resp = FakeResponse(200, body, 'application/json')
+    server = fake_server(FakeSession(resp), logger=logging.getLogger('nutch.test'), maxLogBody=100)
+    with caplog.at_level(logging.DEBUG, logger='nutch.test'):
+        assert len(server.call('get', '/job')) == 1000
+    assert resp.parsed == 1
+    assert len(caplog.records) == 2
+    assert 'more characters' in caplog.records[1].getMessage()
+    assert len(caplog.records[1].getMessage()) < 500
+
+def test_server_middlewares(caplog):
+    import logging
+    session = FakeSession(FakeResponse(200, 'ok'), FakeResponse(404, 'none'), requests.Timeout())
+    server = fake_server(session, retryPolicy=nutch.RetryPolicy(0))
+    events = []
+
+    class Recorder(nutch.Middleware):
+        def __init__(self, name):
+            self.name = name
+
+        def beforeRequest(self, request):
+            events.append((self.name, 'before', request.servicePath))
+
+        def afterResponse(self, request, response):
+            events.append((self.name, 'after', response.status_code))
+
+        def onError(self, request, error):
+            events.append((self.name, 'error', type(error).__name__))
+
+    timing = nutch.TimingMiddleware()
+    slow = nutch.SlowCallMiddleware(threshold=0)
+    profiling = nutch.ProfilingMiddleware(sampleRate=1)
+    server.use(Recorder('a'), Recorder('b'), timing, slow, profiling,
+               nutch.TraceIdMiddleware(generate=lambda: 'trace-1'))
+
+    with caplog.at_level(logging.WARNING, logger='nutch'):
+        assert server.call('get', '/job/crawl-INJECT-1') == 'ok'
+        with pytest.raises(nutch.NutchException):
+            server.call('get', '/job/crawl-INJECT-2')
+        with pytest.raises(requests.Timeout):
+            server.call('get', '/admin', headers={'X-Request-ID': 'mine'})
+
+    assert events == [('a', 'before', '/job/crawl-INJECT-1'), ('b', 'before', '/job/crawl-INJECT-1'),
+                      ('b', 'after', 200), ('a', 'after', 200),
+                      ('a', 'before', '/job/crawl-INJECT-2'), ('b', 'before', '/job/crawl-INJECT-2'),
+                      ('b', 'after', 404), ('a', 'after', 404),
+                      ('b', 'error', 'NutchException'), ('a', 'error', 'NutchException'),
+                      ('a', 'before', '/admin'), ('b', 'before', '/admin'),
+                      ('b', 'error', 'Timeout'), ('a', 'error', 'Timeout')]
+    assert [headers['X-Request-ID'] for headers in session.headers] == ['trace-1', 'trace-1', 'mine']
+    timings = timing.timings()
+    assert timings['GET /job/{id}']['count'] == 2 and timings['GET /job/{id}']['errors'] == 1
+    assert timings['GET /admin']['errors'] == 1
+    assert len(caplog.records) == 3 and all('Slow call' in r.getMessage() for r in caplog.records)
+    assert profiling.sampled == 3
+    out = io.StringIO()
+    profiling.printStats(stream=out)
+    assert 'function calls' in out.getvalue()
+
+def test_server_metrics():
+    session = FakeSession(FakeResponse(200, 'x' * 10), FakeResponse(404, 'none'), requests.Timeout(),
+                          FakeResponse(200, 'abc'))
+    server = fake_server(session, retryPolicy=nutch.RetryPolicy(0))
+    server.call('get', '/job/crawl-INJECT-1')
+    with pytest.raises(nutch.NutchException):
+        server.call('get', '/job/crawl-INJECT-2')
+    with pytest.raises(requests.Timeout):
+        server.call('get', '/job/crawl-INJECT-3/stop')
+    server.call('put', '/config/default/http.agent.name', 'agent', sendJson=False)
+    server.clientMetrics.observeJob('FETCH', 'FINISHED', 42)
+
+    metrics = server.metrics()
+    job = metrics['requests']['GET /job/{id}']
+    assert (job['count'], job['errors'], job['bytesIn']) == (2, {'404': 1}, 14)
+    assert job['latency']['count'] == 2 and job['latency']['buckets'][-1][1] == 2
+    assert metrics['requests']['GET /job/{id}/stop']['errors'] == {'Timeout': 1}
+    assert metrics['requests']['PUT /config/{id}/{param}']['count'] == 1
+    assert metrics['jobs']['FETCH']['states'] == {'FINISHED': 1}
+
+    text = server.clientMetrics.prometheus()
+    assert 'nutch_client_requests_total{endpoint="/job/{id}",verb="get"} 2' in text
+    assert 'nutch_client_request_errors_total{endpoint="/job/{id}",error="404",verb="get"} 1' in text
+    assert 'nutch_client_job_duration_seconds_bucket{le="60",type="FETCH"} 1' in text
+    assert 'nutch_client_job_duration_seconds_bucket{le="30",type="FETCH"} 0' in text
+
+def test_server_circuit_breaker():
+    breaker = nutch.CircuitBreaker(failureThreshold=2, resetTimeout=0.05)
+    session = FakeSession(requests.Timeout(), requests.Timeout(), FakeResponse(200))
+    server = fake_server(session, retryPolicy=nutch.RetryPolicy(0), circuitBreaker=breaker)
+    for attempt in range(2):
+        with pytest.raises(requests.Timeout):
+            server.call('get', '/admin')
+    # the server is not contacted while the circuit is open
+    with pytest.raises(nutch.NutchCircuitOpenException):
+        server.call('get', '/admin')
+    assert len(session.requests) == 2
+
+    sleep(0.05)
+    assert server.call('get', '/admin') == 'ok'
+    assert breaker.state == nutch.CircuitBreaker.CLOSED
+
+    # a probe failing with another error opens the circuit again, instead of leaving it half-open
+    session = FakeSession(requests.Timeout(), requests.exceptions.ChunkedEncodingError(), FakeResponse(200))
+    breaker = nutch.CircuitBreaker(failureThreshold=1, resetTimeout=0.05)
+    server = fake_server(session, retryPolicy=nutch.RetryPolicy(0), circuitBreaker=breaker)
+    with pytest.raises(requests.Timeout):
+        server.call('get', '/admin')
+    sleep(0.05)
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        server.call('get', '/admin')
+    assert breaker.state == nutch.CircuitBreaker.OPEN
+    sleep(0.05)
+    assert server.call('get', '/admin') == 'ok'
+    assert breaker.state == nutch.CircuitBreaker.CLOSED
+
+def test_server_pool_routing():
+    def member(name, running, healthy=True):
+        server = nutch.Server('http://%s:8081' % name)
+        server.calls = []
+
+        def call(verb, servicePath, *args):
+            server.calls.append((verb, servicePath))
+            if servicePath == '/admin' and not healthy:
+                raise requests.ConnectionError()
+            if servicePath == '/job':
+                return [{'id': '%s-%d' % (name, i), 'state': 'RUNNING'} for i in range(running)]
+            return name
+
+        server.call = call
+        return server
+
+    busy, idle, down = member('busy', 3), member('idle', 1), member('down', 0, healthy=False)
+    pool = nutch.ServerPool([busy, idle, down])
+
+    # new crawls go to the least-loaded healthy server, and stay there
+    assert pool.serverFor('crawl1') is idle
+    assert pool.call('post', '/job/create', {'crawlId': 'crawl1'}) == 'idle'
+    assert pool.serverFor('crawl1') is idle
+    assert pool.call('post', '/db/crawldb', {'crawlId': 'crawl1'}) == 'idle'
+    # job clients work with the member of their crawl
+    jc = nutch.nutch.JobClient(pool, 'crawl1', 'default')
+    assert jc.server is idle and jc.stats() == 'idle'
+    # configuration changes reach every healthy server
+    pool.call('put', '/config/default/http.agent.name', 'agent', sendJson=False)
+    assert ('put', '/config/default/http.agent.name') in busy.calls
+    assert ('put', '/config/default/http.agent.name') in idle.calls
+    assert ('put', '/config/default/http.agent.name') not in down.calls
+    assert len(pool.call('get', '/job')) == 4
+
+def test_server_pool_releases_pins():
+    from nutch.mockserver import MockNutchServer
+    with MockNutchServer(defaultDuration=0) as first, MockNutchServer(defaultDuration=0) as second:
+        pool = nutch.ServerPool([first.endpoint, second.endpoint])
+        nt = nutch.Nutch(server=pool)
+        seeds = nt.Seeds().createStream('parts', ['http://a%d.example.com/' % i for i in range(10)], chunkSize=3)
+        assert len(seeds) == 4 and len(set(seed.server for seed in seeds)) == 1
+        assert pool.pins == {}
+        cc = nt.Crawl(['http://a.example.com/'], rounds=2, index=False)
+        cc.sleepTime = 0
+        assert list(pool.pins) == [cc.crawlId]
+        cc.waitAll()
+        assert pool.pins == {}
+
+def test_clients_share_server():
+    nt = get_nutch()
+    assert nt.Jobs().server is nt.server
+    assert nt.Configs().server is nt.server
+    assert nt.Seeds().server is nt.server
+
 ## Configurations
 
 def get_config_client():
@@ -61,6 +351,120 @@ def test_config_copy():
     cc['defaultcopy'] = default_config_data
     assert cc['defaultcopy'].info()["db.fetch.interval.max"]
 
+def config_server(params):
+    """A Server holding one configuration 'default' with the given parameters, recording every call"""
+    server = nutch.Server(nutch.nutch.DefaultServerEndpoint)
+    server.calls = []
+    server.params = params
+
+    def call(verb, servicePath, data=None, headers=None, forceText=False, sendJson=True, **kwargs):
+        server.calls.append((verb, servicePath))
+        path = servicePath.split('/')
+        if verb == 'get' and len(path) == 3:
+            return dict(params)
+        if verb == 'get':
+            return params[path[3]]
+        if verb == 'put':
+            params[path[3]] = data
+        if verb == 'post':
+            params.clear()
+            params.update(data['params'])
+            return data['configId']
+
+    server.call = call
+    return server
+
+def test_config_cache():
+    server = config_server({'param%d' % i: str(i) for i in range(50)})
+    config = nutch.nutch.ConfigClient(server)['default']
+    assert [config['param%d' % i] for i in range(50)] == [str(i) for i in range(50)]
+    assert 'param7' in config
+    assert server.calls == [('get', '/config/default')]
+
+    # our own writes are visible without a round trip
+    config['param7'] = 'seven'
+    assert config['param7'] == 'seven'
+    assert len(server.calls) == 2
+
+    config.invalidate()
+    assert config.params()['param7'] == 'seven'
+    assert server.calls[-1] == ('get', '/config/default')
+
+def test_config_update():
+    server = config_server({'param%d' % i: str(i) for i in range(150)})
+    config = nutch.nutch.ConfigClient(server)['default']
+
+    changes = config.update({'param1': 1, 'param2': 'two', 'new': 'x'})
+    assert changes == {'param2': ('2', 'two'), 'new': (None, 'x')}
+    assert sorted(server.calls[1:]) == [('put', '/config/default/new'), ('put', '/config/default/param2')]
+
+    # many changes are sent in a single request, on top of fresh parameters
+    del server.calls[:]
+    server.params['param140'] = 'set elsewhere'
+    changes = config.update(dict(('param%d' % i, 'changed') for i in range(100)))
+    assert len(changes) == 100
+    assert server.calls == [('get', '/config/default'), ('post', '/config/create')]
+    assert server.params['param140'] == 'set elsewhere'
+    assert config['param99'] == 'changed' and config['param120'] == '120' and config['new'] == 'x'
+    assert config.update({'param5': 'changed'}) == {}
+
+    # the cache holds what the server returns
+    del server.calls[:]
+    changes = config.update(dict(('param%d' % i, i + 1) for i in range(100, 110)))
+    assert config['param100'] == '101' and config.update({'param100': 101}) == {}
+
+def test_config_template():
+    server = nutch.Server(nutch.nutch.DefaultServerEndpoint)
+    server.calls = []
+    created = {}
+    lock = threading.Lock()
+
+    def call(verb, servicePath, data=None, **kwargs):
+        with lock:
+            server.calls.append((verb, servicePath))
+        if verb == 'get':
+            return {'http.agent.name': 'base', 'generate.topN': '1000'}
+        created[data['configId']] = data['params']
+        return data['configId']
+
+    server.call = call
+    template = nutch.nutch.ConfigClient(server).template('default')
+    configs = template.deriveMany(dict(('customer%d' % i, {'http.agent.name': 'agent%d' % i})
+                                       for i in range(20)), workers=4)
+    assert server.calls.count(('get', '/config/default')) == 1
+    assert server.calls.count(('post', '/config/create')) == 20
+    assert created['customer3'] == {'http.agent.name': 'agent3', 'generate.topN': '1000'}
+    assert configs['customer3'].id == 'customer3'
+    assert configs['customer3']['generate.topN'] == '1000'
+    assert len(server.calls) == 21
+
+    # overrides are cached as the text the server returns
+    config = template.derive('typed', {'generate.topN': 500})
+    assert config['generate.topN'] == '500'
+    assert config.update({'generate.topN': 500}) == {}
+    assert len(server.calls) == 22
+
+def test_parse_xml_conf(tmpdir):
+    from nutch.crawl import parse_xml_conf
+    conf_file = tmpdir.join('nutch-site.xml')
+    conf_file.write('''<?xml version="1.0"?>
+<configuration>
+  <property><name>http.agent.name</name><value> nutch-python </value></property>
+  <property><name>plugin.excludes</name><value/><description>empty</description></property>
+</configuration>''')
+    params = parse_xml_conf(str(conf_file))
+    assert params == {'http.agent.name': 'nutch-python', 'plugin.excludes': ''}
+
+def test_config_cache_ttl():
+    server = config_server({'a': '1'})
+    config = nutch.Config('default', server, ttl=0.05)
+    assert config['a'] == '1'
+    config.info()
+    assert config['a'] == '1'
+    sleep(0.05)
+    assert config['a'] == '1'
+    assert server.calls == [('get', '/config/default/a'), ('get', '/config/default'), ('get', '/config/default/a')]
+
 ## Seed Lists
 
 # Fairly limited functionality for working with seed lists
@@ -78,6 +482,65 @@ def get_seed(seed_urls=('http://aron.ahmadia.net', 'http://www.google.com')):
     return sc.create('test_seed', seed_urls)
 
 
+def test_seed_create_stream(tmpdir):
+    import gzip
+    seed_file = str(tmpdir.join('seeds.txt.gz'))
+    with gzip.open(seed_file, 'wt') as f:
+        for i in range(25):
+            f.write('http://example%d.com/ http://example%d.org/\n' % (i, i))
+
+    server = nutch.Server(nutch.nutch.DefaultServerEndpoint)
+    uploads = []
+
+    def call(verb, servicePath, data=None, *args):
+        uploads.append(data)
+        return '/tmp/' + data['name']
+
+    server.call = call
+    reports = []
+    seeds = nutch.nutch.SeedClient(server).createFromFile('big', seed_file, chunkSize=20,
+                                                          progress=lambda *report: reports.append(report))
+    assert [seed.id for seed in seeds] == ['big_part00000', 'big_part00001', 'big_part00002']
+    assert [len(upload['seedUrls']) for upload in uploads] == [20, 20, 10]
+    assert uploads[0]['seedUrls'][1] == {'id': 1, 'url': 'http://example0.org/'}
+    assert reports == [(1, 20), (2, 40), (3, 50)]
+
+    # a crawl injects every part before generating
+    server = scripted_server()
+    cc = nutch.nutch.CrawlClient(server, seeds, nutch.nutch.JobClient(server, 'crawl', 'default'), 1, False,
+                                 nutch.nutch.FixedPolling(0))
+    assert [job.type for job in cc.waitAll()[0][:4]] == ['INJECT', 'INJECT', 'INJECT', 'GENERATE']
+
+
+def test_normalize_url():
+    normalize = nutch.nutch.normalizeUrl
+    assert normalize(' HTTP://Example.COM:80/Path/#top ') == 'http://example.com/Path'
+    assert normalize('https://example.com:443') == 'https://example.com/'
+    assert normalize('example.com:8080/a/?q=1') == 'http://example.com:8080/a?q=1'
+    assert normalize('http://[::1]:8080/a/') == 'http://[::1]:8080/a'
+    assert normalize('http://[2001:DB8::1]/') == 'http://[2001:db8::1]/'
+    with pytest.raises(ValueError):
+        normalize('http://b.com:8o/')
+
+@pytest.mark.parametrize('dedup', ['exact', 'bloom'])
+def test_seed_filter(dedup):
+    seed_filter = nutch.nutch.SeedFilter(dedup=dedup, capacity=1000)
+    urls = ['http://a.com/', 'http://A.com', 'http://a.com/#x', '', 'http://b.com/x/', 'http://b.com/x']
+    assert list(seed_filter.filter(urls)) == ['http://a.com/', 'http://b.com/x']
+    assert (seed_filter.kept, seed_filter.dropped) == (2, 4)
+    # a malformed URL is dropped without stopping the stream
+    assert list(seed_filter.filter(['http://b.com:8o/', 'http://c.com/'])) == ['http://c.com/']
+    assert (seed_filter.kept, seed_filter.dropped) == (3, 5)
+
+def test_bloom_filter_error_rate():
+    bloom = nutch.nutch.BloomFilter(10000, 0.01)
+    for i in range(0, 20000, 2):
+        bloom.add('http://example.com/%d' % i)
+    assert all('http://example.com/%d' % i in bloom for i in range(0, 20000, 2))
+    false_positives = sum('http://example.com/%d' % i in bloom for i in range(1, 20000, 2))
+    assert false_positives < 10000 * 0.02
+    assert len(bloom.bits) < 15000
+
 def test_seed_create():
     seed_urls = ('http://aron.ahmadia.net', 'http://www.google.com')
     seed = get_seed(seed_urls)
@@ -163,6 +626,39 @@ def test_job_generate():
     assert(job_info['confId'] == nt.confId)
 
 
+def test_job_poller_one_request_per_tick():
+    server = nutch.Server(nutch.nutch.DefaultServerEndpoint)
+    table = [{'id': 'job-%d' % i, 'state': 'RUNNING'} for i in range(50)]
+    calls = []
+
+    def call(verb, servicePath, **kwargs):
+        calls.append((verb, servicePath))
+        return [dict(info) for info in table]
+
+    server.call = call
+    poller = nutch.JobPoller(server)
+    jobs = [nutch.Job('job-%d' % i, server, poller) for i in range(50)]
+
+    poller.tick()
+    table[7]['state'] = 'FINISHED'
+    poller.tick()
+    assert calls == [('get', '/job')] * 2
+    assert poller.info('job-7')['state'] == 'FINISHED'
+    assert poller.info('job-8')['state'] == 'RUNNING'
+
+    # the JobInfo returned by /job/create is served until the next tick, which is authoritative
+    poller.update({'id': 'job-new', 'state': 'RUNNING'})
+    assert poller.info('job-new')['state'] == 'RUNNING'
+    poller.tick()
+    assert poller.info('job-new') is None
+
+    poller.start()
+    try:
+        assert [job.info()['state'] for job in jobs].count('FINISHED') == 1
+    finally:
+        poller.stop()
+
+
 def test_job_stop():
     inject_job = get_inject_job()
     inject_job.stop()
@@ -177,6 +673,422 @@ def test_job_abort():
     assert(inject_job.info()['state'] == 'KILLED')
 # How do we delete jobs using the REST API?  Is it even possible?
 
+def test_adaptive_polling():
+    polling = nutch.nutch.AdaptivePolling(minDelay=0.5, maxDelay=60, factor=2, jitter=0)
+    # nothing learned yet: poll quickly after submission, then back off
+    assert polling.delay('FETCH', 0) == 0.5
+    assert polling.delay('FETCH', 10) == 10
+    assert polling.delay('FETCH', 1000) == 60
+
+    polling.observe('FETCH', 50)
+    # wake up when a FETCH usually finishes, then back off from there
+    assert polling.delay('FETCH', 10) == 40
+    assert polling.delay('FETCH', 50) == 0.5
+    assert polling.delay('FETCH', 70) == 20
+    # other job types are unaffected
+    assert polling.delay('PARSE', 10) == 10
+
+    polling.observe('FETCH', 150)
+    assert polling.durations['FETCH'] == 80
+
+def scripted_server(polls_per_job=1):
+    """A Server whose jobs finish after being polled polls_per_job times, recording every call"""
+    server = nutch.Server(nutch.nutch.DefaultServerEndpoint)
+    server.calls = []
+    jobs = server.jobs = {}
+    ids = itertools.count()
+
+    def call(verb, servicePath, data=None, headers=None, **kwargs):
+        server.calls.append((verb, servicePath))
+        if servicePath == '/job':
+            return [dict(job) for job in jobs.values()]
+        if servicePath == '/db/crawldb':
+            return {'totalUrls': str(10 * len(jobs)), 'status': {'db_fetched': {'count': len(jobs)}}, 'name': 'stats'}
+        if servicePath == '/job/create':
+            jid = 'job-%d' % next(ids)
+            jobs[jid] = {'id': jid, 'type': data['type'], 'state': 'RUNNING', 'polls': 0,
+                         'crawlId': data['crawlId'], 'confId': data['confId']}
+            return dict(jobs[jid])
+        job = jobs[servicePath.split('/')[2]]
+        job['polls'] += 1
+        if job['polls'] >= polls_per_job:
+            job['state'] = 'FINISHED'
+        return dict(job)
+
+    server.call = call
+    return server
+
+def test_crawl_client_request_budget():
+    server = scripted_server(polls_per_job=3)
+    jc = nutch.nutch.JobClient(server, 'crawl', 'default')
+    seed = nutch.nutch.Seed('seed', '/tmp/seed', server)
+    cc = nutch.nutch.CrawlClient(server, seed, jc, 2, False, nutch.nutch.FixedPolling(0))
+    rounds = cc.waitAll()
+    assert [[job.type for job in jobs] for jobs in rounds] == [
+        ['INJECT', 'GENERATE', 'FETCH', 'PARSE', 'UPDATEDB', 'INVERTLINKS', 'DEDUP'],
+        ['GENERATE', 'FETCH', 'PARSE', 'UPDATEDB', 'INVERTLINKS', 'DEDUP']]
+    # one creation and three status checks per job, nothing else
+    assert cc.requestCount == len(server.calls) == 13 * 4
+    assert cc.currentJob is None
+
+def test_crawl_client_failed_job_counted_once():
+    server = scripted_server(polls_per_job=100)
+    jc = nutch.nutch.JobClient(server, 'crawl', 'default')
+    seed = nutch.nutch.Seed('seed', '/tmp/seed', server)
+    cc = nutch.nutch.CrawlClient(server, seed, jc, 1, False, nutch.nutch.FixedPolling(0))
+    server.jobs[cc.currentJob.id]['state'] = 'FAILED'
+    for attempt in range(3):
+        with pytest.raises(nutch.nutch.NutchCrawlException):
+            cc.progress()
+    assert server.metrics()['jobs']['INJECT']['states'] == {'FAILED': 1}
+
+def test_crawl_client_round_reports():
+    server = scripted_server(polls_per_job=2)
+    jc = nutch.nutch.JobClient(server, 'crawl', 'default')
+    seed = nutch.nutch.Seed('seed', '/tmp/seed', server)
+    cc = nutch.nutch.CrawlClient(server, seed, jc, 2, True, nutch.nutch.FixedPolling(0), roundStats=True)
+    cc.waitAll()
+    assert [report.round for report in cc.roundReports] == [1, 2]
+    assert [phase.jobType for phase in cc.roundReports[0].phases] == [
+        'INJECT', 'GENERATE', 'FETCH', 'PARSE', 'UPDATEDB', 'INVERTLINKS', 'DEDUP', 'INDEX']
+    for report in cc.roundReports:
+        for phase in report.phases:
+            assert phase.state == 'FINISHED'
+            assert phase.submitted <= phase.started <= phase.finished
+            assert phase.queueWait >= 0 and phase.duration >= 0
+    # 8 jobs in round 1, 7 in round 2
+    assert cc.roundReports[0].statsDelta == {'totalUrls': 80, 'status': {'db_fetched': {'count': 8}}}
+    assert cc.roundReports[1].statsDelta == {'totalUrls': 70, 'status': {'db_fetched': {'count': 7}}}
+    # 2 stats calls per round
+    assert cc.requestCount == len(server.calls) == 15 * 3 + 4
+
+    out = io.StringIO()
+    nutch.nutch.writeRoundReportsCsv(cc.roundReports, out)
+    rows = out.getvalue().splitlines()
+    assert rows[0].split(',') == nutch.nutch.RoundReport.ReportFields
+    assert len(rows) == 16 and rows[-1].startswith('2,job-14,INDEX,FINISHED,')
+    out = io.StringIO()
+    nutch.nutch.writeRoundReportsJson(cc.roundReports, out)
+    reports = json.loads(out.getvalue())
+    assert reports[1]['statsDelta']['totalUrls'] == 70
+    assert reports[1]['phases'][0]['type'] == 'GENERATE'
+
+def test_crawl_client_pipeline():
+    from nutch.nutch import Pipeline, PipelineNode, everyNthRound
+    server = scripted_server(polls_per_job=2)
+    jc = nutch.nutch.JobClient(server, 'crawl', 'default')
+    seed = nutch.nutch.Seed('seed', '/tmp/seed', server)
+    pipeline = Pipeline([PipelineNode('generate', args={'topN': 10}), PipelineNode('fetch', after=['generate']),
+                         PipelineNode('parse', after=['fetch']), PipelineNode('updatedb', after=['parse']),
+                         PipelineNode('invertlinks', after=['parse']), PipelineNode('dedup', after=['updatedb']),
+                         PipelineNode('index', after=['dedup', 'invertlinks'], condition=everyNthRound(2))])
+    cc = nutch.nutch.CrawlClient(server, seed, jc, 3, True, nutch.nutch.FixedPolling(0), pipeline=pipeline)
+
+    rounds = []
+    while cc.currentJob is not None:
+        rounds.append([job.type for job in cc.currentJobs])
+        cc.progress()
+    # UPDATEDB and INVERTLINKS run together, INDEX runs in round 2 and in the last round
+    assert rounds == [['INJECT']] * 2 + (
+        [['GENERATE']] * 2 + [['FETCH']] * 2 + [['PARSE']] * 2 + [['UPDATEDB', 'INVERTLINKS']] * 2 + [['DEDUP']] * 2
+    ) + ([['GENERATE']] * 2 + [['FETCH']] * 2 + [['PARSE']] * 2 + [['UPDATEDB', 'INVERTLINKS']] * 2 +
+         [['DEDUP']] * 2 + [['INDEX']] * 2) * 2
+    assert cc.requestCount == len(server.calls)
+    assert [len(report.phases) for report in cc.roundReports] == [7, 7, 7]
+
+    with pytest.raises(nutch.NutchException):
+        Pipeline([PipelineNode('fetch', after=['parse']), PipelineNode('parse', after=['fetch'])])
+    with pytest.raises(nutch.NutchException):
+        Pipeline([PipelineNode('fetch', after=['generate'])])
+    with pytest.raises(nutch.NutchException):
+        Pipeline([PipelineNode('sitemap')])
+
+def test_crawl_client_pipelined_rounds():
+    server = scripted_server(polls_per_job=2)
+    seed = nutch.nutch.Seed('seed', '/tmp/seed', server)
+
+    def crawl():
+        jc = nutch.nutch.JobClient(server, 'crawl', 'default')
+        return nutch.nutch.CrawlClient(server, seed, jc, 3, True, nutch.nutch.FixedPolling(0), maxOverlap=1)
+
+    cc = crawl()
+    running = []
+    while cc.currentJob is not None:
+        running.append(sorted((cc._nodes[id(job)][0].round, job.type) for job in cc.currentJobs))
+        cc.progress()
+    # the GENERATE of the next round starts along with INVERTLINKS, once UPDATEDB is done
+    assert [(1, 'INVERTLINKS'), (2, 'GENERATE')] in running
+    assert [(2, 'INVERTLINKS'), (3, 'GENERATE')] in running
+    # at most two rounds at once
+    assert max(len(set(round for round, jobType in jobs)) for jobs in running) == 2
+
+    rounds = crawl().waitAll()
+    assert [[job.type for job in jobs] for jobs in rounds] == [
+        ['INJECT', 'GENERATE', 'FETCH', 'PARSE', 'UPDATEDB', 'INVERTLINKS', 'DEDUP', 'INDEX'],
+        ['GENERATE', 'FETCH', 'PARSE', 'UPDATEDB', 'INVERTLINKS', 'DEDUP', 'INDEX'],
+        ['GENERATE', 'FETCH', 'PARSE', 'UPDATEDB', 'INVERTLINKS', 'DEDUP', 'INDEX']]
+
+def test_crawl_client_resume(tmpdir):
+    checkpoint = str(tmpdir.join('crawl.json'))
+    server = scripted_server(polls_per_job=2)
+    jc = nutch.nutch.JobClient(server, 'crawl', 'default')
+    seeds = [nutch.nutch.Seed('seed%d' % i, '/tmp/seed%d' % i, server) for i in range(2)]
+    cc = nutch.nutch.CrawlClient(server, seeds, jc, 2, False, nutch.nutch.FixedPolling(0), checkpoint=checkpoint)
+    while cc.currentJob is None or cc.currentJob.type != 'PARSE':
+        cc.progress()
+    # the driver dies while PARSE runs
+    assert nutch.nutch.CrawlCheckpoint(checkpoint).load()['running'][0]['type'] == 'PARSE'
+
+    resumed = nutch.nutch.CrawlClient.resume(checkpoint, server, polling=nutch.nutch.FixedPolling(0))
+    assert resumed.crawlId == 'crawl' and resumed.currentJob.id == cc.currentJob.id
+    rounds = resumed.waitAll()
+    assert [[job.type for job in jobs] for jobs in rounds] == [
+        ['PARSE', 'UPDATEDB', 'INVERTLINKS', 'DEDUP'],
+        ['GENERATE', 'FETCH', 'PARSE', 'UPDATEDB', 'INVERTLINKS', 'DEDUP']]
+    # 2 INJECT, 6 jobs per round, nothing ran twice
+    assert len(server.jobs) == 14
+    assert nutch.nutch.CrawlCheckpoint(checkpoint).load()['currentRound'] == 3
+
+    # jobs lost by the server are submitted again
+    cc = nutch.nutch.CrawlClient(server, seeds, jc, 1, False, nutch.nutch.FixedPolling(0), checkpoint=checkpoint)
+    del server.jobs[cc.currentJob.id]
+    resumed = nutch.nutch.CrawlClient.resume(checkpoint, server, polling=nutch.nutch.FixedPolling(0))
+    assert resumed.currentJob.type == 'INJECT' and resumed.currentJob.id != cc.currentJob.id
+    assert [job.type for job in resumed.waitAll()[0]] == ['INJECT', 'INJECT', 'GENERATE', 'FETCH', 'PARSE',
+                                                           'UPDATEDB', 'INVERTLINKS', 'DEDUP']
+
+def test_crawl_client_resume_after_submit(tmpdir):
+    checkpoint = str(tmpdir.join('crawl.json'))
+    server = scripted_server(polls_per_job=1)
+    jc = nutch.nutch.JobClient(server, 'crawl', 'default')
+    seed = nutch.nutch.Seed('seed', '/tmp/seed', server)
+    cc = nutch.nutch.CrawlClient(server, seed, jc, 2, False, nutch.nutch.FixedPolling(0), checkpoint=checkpoint)
+    while cc.currentJob.type != 'FETCH':
+        cc.progress()
+    # the driver dies after submitting PARSE, before saving its id
+    save = cc.checkpoint.save
+    cc.checkpoint.save = lambda state: state['submitting'] and save(state)
+    while cc.currentJob.type != 'PARSE':
+        cc.progress()
+    assert nutch.nutch.CrawlCheckpoint(checkpoint).load()['submitting'] == ['PARSE']
+
+    resumed = nutch.nutch.CrawlClient.resume(checkpoint, server, polling=nutch.nutch.FixedPolling(0))
+    assert resumed.currentJob.id == cc.currentJob.id
+    resumed.waitAll()
+    assert [job['type'] for job in server.jobs.values()].count('PARSE') == 2
+    assert len(server.jobs) == 13
+    assert nutch.nutch.CrawlCheckpoint(checkpoint).load()['submitting'] == []
+
+def test_crawl_client_resume_finished(tmpdir):
+    import asyncio
+    from nutch.aio import AsyncCrawlClient, AsyncServer
+    checkpoint = str(tmpdir.join('crawl.json'))
+    server = scripted_server(polls_per_job=1)
+    jc = nutch.nutch.JobClient(server, 'crawl', 'default')
+    seed = nutch.nutch.Seed('seed', '/tmp/seed', server)
+    polling = nutch.nutch.FixedPolling(0)
+
+    # finished through waitAll, through progress() and through the async waitAll
+    cc = nutch.nutch.CrawlClient(server, seed, jc, 2, False, polling, checkpoint=checkpoint)
+    cc.waitAll()
+    assert cc.waitAll() == [] and cc.nextRound() == []
+    drivers = [lambda cc: cc.waitAll(), lambda cc: list(cc.events()),
+               lambda cc: asyncio.run(AsyncCrawlClient(cc, AsyncServer(server)).waitAll())]
+    for driver in drivers:
+        cc = nutch.nutch.CrawlClient(server, seed, jc, 2, False, polling, checkpoint=checkpoint)
+        driver(cc)
+        saved = nutch.nutch.CrawlCheckpoint(checkpoint).load()
+        assert saved['finishedRound'] == 2 and saved['rounds'] == saved['running'] == []
+        assert saved['currentRound'] == cc.currentRound
+        jobs = len(server.jobs)
+        resumed = nutch.nutch.CrawlClient.resume(checkpoint, server, polling=polling)
+        assert resumed.waitAll() == []
+        assert len(server.jobs) == jobs
+
+    # rounds added after the end are run
+    resumed.addRounds(1)
+    assert [job.type for job in resumed.nextRound()] == nutch.nutch.RoundJobs
+
+def test_crawl_client_events():
+    from nutch.nutch import CrawlEvent
+    server = scripted_server(polls_per_job=2)
+    jc = nutch.nutch.JobClient(server, 'crawl', 'default')
+    seed = nutch.nutch.Seed('seed', '/tmp/seed', server)
+    cc = nutch.nutch.CrawlClient(server, seed, jc, 2, False, nutch.nutch.FixedPolling(0), roundStats=True)
+    rounds = []
+    cc.addCallback(lambda event: rounds.append(event.report.round), [CrawlEvent.ROUND])
+    cc.addCallback(lambda event: 1 / 0)
+
+    events = list(cc.events())
+    jobEvents = [(event.type, event.job.type) for event in events if event.job is not None]
+    # INJECT was submitted before events() was called
+    assert jobEvents[:4] == [('started', 'INJECT'), ('finished', 'INJECT'), ('submitted', 'GENERATE'),
+                             ('started', 'GENERATE')]
+    assert len(jobEvents) == 3 * 13 - 1
+    assert [event.round for event in events if event.type == CrawlEvent.ROUND] == rounds == [1, 2]
+    # stats before and after round 2, after round 1
+    assert [event.type for event in events].count(CrawlEvent.STATS) == 3
+    assert cc.currentJob is None
+
+    server = scripted_server(polls_per_job=1)
+    cc = nutch.nutch.CrawlClient(server, seed, nutch.nutch.JobClient(server, 'crawl', 'default'), 1, False,
+                                 nutch.nutch.FixedPolling(0))
+    server.jobs['job-0']['fails'] = True
+    original = server.call
+
+    def call(verb, servicePath, *args, **kwargs):
+        info = original(verb, servicePath, *args, **kwargs)
+        if isinstance(info, dict) and info.get('fails'):
+            info['state'] = 'FAILED'
+        return info
+
+    server.call = call
+    events = []
+    with pytest.raises(nutch.nutch.NutchCrawlException):
+        for event in cc.events():
+            events.append(event)
+    assert [(event.type, event.state) for event in events] == [('failed', 'FAILED')]
+
+def test_async_crawl_client_events():
+    import asyncio
+    from nutch.aio import AsyncCrawlClient, AsyncServer
+    server = scripted_server(polls_per_job=2)
+    seed = nutch.nutch.Seed('seed', '/tmp/seed', server)
+    cc = nutch.nutch.CrawlClient(server, seed, nutch.nutch.JobClient(server, 'crawl', 'default'), 1, True,
+                                 nutch.nutch.FixedPolling(0))
+    aserver = AsyncServer(server)
+
+    async def run():
+        return [event async for event in AsyncCrawlClient(cc, aserver).events()]
+
+    events = asyncio.run(run())
+    aserver.close()
+    assert [event.type for event in events][-2:] == ['finished', 'round']
+    assert [event.job.type for event in events if event.type == 'finished'] == [
+        'INJECT', 'GENERATE', 'FETCH', 'PARSE', 'UPDATEDB', 'INVERTLINKS', 'DEDUP', 'INDEX']
+
+def test_job_client_args_not_shared():
+    server = scripted_server()
+    server.call = lambda verb, servicePath, data=None, *args: dict(data, id='job')
+    jc = nutch.nutch.JobClient(server, 'crawl', 'default')
+    jc.create('GENERATE', topN=10)
+    jc.create('FETCH')
+    assert jc.parameters['args'] == {}
+
+def test_job_scheduler_priority_and_fairness():
+    server = scripted_server(polls_per_job=1)
+    scheduler = nutch.JobScheduler(maxPerServer=1, interval=60)
+    a, b, c = [nutch.nutch.JobClient(server, crawlId, 'default', scheduler=scheduler) for crawlId in 'abc']
+    first = a.create('GENERATE')
+    assert not first.queued and first.id == 'job-0'
+    queued = [a.create('FETCH'), a.create('PARSE'), b.create('FETCH'), c.create('FETCH'), b.create('DEDUP')]
+    assert all(job.queued for job in queued) and len(scheduler.queued()) == 5
+    assert queued[0].info()['state'] == 'IDLE'
+    assert queued[4].abort() and queued[4].info()['state'] == 'KILLED'
+    scheduler.setPriority('c', 1)
+
+    order = []
+    running = first
+    while running is not None:
+        assert running.info()['state'] == 'FINISHED'
+        running = [job for job in queued if not job.queued and job not in order]
+        assert len(running) <= 1 and scheduler.running(server.serverEndpoint) == len(running)
+        running = running[0] if running else None
+        order.append(running)
+    # priority first, then the crawl with fewer submitted jobs, then arrival order
+    assert order[:-1] == [queued[3], queued[2], queued[0], queued[1]]
+    assert [verb for verb, path in server.calls].count('post') == 5
+
+def test_job_scheduler_caps_crawls():
+    server = scripted_server(polls_per_job=2)
+    scheduler = nutch.JobScheduler(maxPerServer=2, maxPerType={'fetch': 1}, interval=0)
+    original = server.call
+
+    def call(*args, **kwargs):
+        # no request is made while holding the scheduler lock
+        assert scheduler._lock.acquire(False)
+        scheduler._lock.release()
+        return original(*args, **kwargs)
+
+    server.call = call
+    seed = nutch.nutch.Seed('seed', '/tmp/seed', server)
+    crawls = [nutch.nutch.CrawlClient(server, seed, nutch.nutch.JobClient(server, 'crawl_%d' % i, 'default',
+                                                                          scheduler=scheduler),
+                                      2, False, nutch.nutch.FixedPolling(0)) for i in range(4)]
+    active = crawls
+    while active:
+        running = [job for job in server.jobs.values() if job['state'] == 'RUNNING']
+        assert len(running) <= 2 and [job['type'] for job in running].count('FETCH') <= 1
+        active = [cc for cc in active if cc.progress() is not None]
+    assert not scheduler.queued() and scheduler.running() == 0
+    for cc in crawls:
+        assert [phase.jobType for report in cc.roundReports for phase in report.phases] == \
+            ['INJECT'] + nutch.nutch.RoundJobs * 2
+        assert all(phase.state == 'FINISHED' for report in cc.roundReports for phase in report.phases)
+
+def test_job_scheduler_cancel_in_flight():
+    server = scripted_server(polls_per_job=5)
+    scheduler = nutch.JobScheduler(maxPerServer=1, interval=0)
+    jc = nutch.nutch.JobClient(server, 'crawl', 'default', scheduler=scheduler)
+    first = jc.create('GENERATE')
+    queued = jc.create('FETCH')
+    original = server.call
+    cancelled = []
+
+    def call(verb, servicePath, *args, **kwargs):
+        if servicePath == '/job/create' and not cancelled:
+            # stopped by another thread while its creation is in flight
+            cancelled.append(queued.stop())
+        return original(verb, servicePath, *args, **kwargs)
+
+    server.call = call
+    server.jobs[first.id]['state'] = 'FINISHED'
+    first.info()
+    assert cancelled == [True] and queued.id == 'job-1'
+    assert server.calls[-3:-1] == [('post', '/job/create'), ('get', '/job/job-1/stop')]
+    # a submitted job is stopped on its server
+    assert queued.stop()['id'] == 'job-1'
+    assert server.calls[-1] == ('get', '/job/job-1/stop')
+
+def test_shard_seeds_by_host():
+    urls = ['http://host%d.example.com/page%d' % (i % 20, i) for i in range(200)]
+    shards = nutch.nutch.shardSeeds(urls, 4)
+    assert sorted(sum(shards, [])) == sorted(urls)
+    hosts = [set(nutch.nutch.hostOf(url) for url in shard) for shard in shards]
+    # each host is in exactly one shard
+    assert sum(len(h) for h in hosts) == 20
+    assert all(hosts)
+    # the assignment is stable
+    assert nutch.nutch.shardSeeds(urls, 4) == shards
+    assert nutch.nutch.hostOf('WWW.Example.com:8080/x') == 'www.example.com'
+
+def test_spill_shard_seeds(tmpdir):
+    urls = ['http://host%d.example.com/page%d' % (i % 20, i) for i in range(200)]
+    spilled = nutch.nutch.spillShardSeeds(iter(urls), 4, str(tmpdir))
+    assert [count for filename, count in spilled] == [len(shard) for shard in nutch.nutch.shardSeeds(urls, 4)]
+    assert [list(nutch.nutch.iterSeedFile(filename)) for filename, count in spilled] == \
+        nutch.nutch.shardSeeds(urls, 4)
+
+def test_sharded_crawl_streams_seeds():
+    urls = ['http://host%d.example.com/page%d' % (i % 20, i) for i in range(50)]
+    sharded = get_nutch().ShardedCrawl(urls, 3, index=False, chunkSize=4)
+    seeds = [crawl._pendingSeeds + [crawl._seeds[id(job)] for job in crawl.currentJobs] for crawl in sharded.crawls]
+    assert all(len(shardSeeds) > 1 for shardSeeds in seeds)
+    sharded.waitAll()
+    assert sharded.currentJobs == []
+
+def test_sharded_crawl_client():
+    server = scripted_server(polls_per_job=2)
+    seed = nutch.nutch.Seed('seed', '/tmp/seed', server)
+    crawls = [nutch.nutch.CrawlClient(server, seed, nutch.nutch.JobClient(server, 'crawl_%d' % i, 'default'),
+                                      i + 1, False, nutch.nutch.FixedPolling(0)) for i in range(3)]
+    sharded = nutch.nutch.ShardedCrawlClient(crawls)
+    assert len(sharded.currentJobs) == 3
+    finished = sharded.waitAll()
+    # INJECT plus six jobs per round
+    assert [len(jobs) for jobs in finished] == [7, 13, 19]
+    assert sharded.currentJobs == []
+
 def get_crawl_client():
     seed = get_seed()
     return get_nutch().Crawl(seed, index=False)
@@ -185,6 +1097,51 @@ def get_crawl_client():
 
 # TODO: refactor injection job so we can test stats after it completes
 
+def test_async_crawl_client():
+    import asyncio
+    from nutch.aio import AsyncNutch
+
+    async def run():
+        nt = await AsyncNutch.connect(serverEndpoint=ENDPOINT)
+        seed = await nt.Seeds().create('test_seed', ('http://aron.ahmadia.net',))
+        cc = await nt.Crawl(seed, index=False)
+        assert (await cc.currentJob.info())['type'] == 'INJECT'
+        rounds = await cc.waitAll()
+        nt.close()
+        return cc, rounds
+
+    cc, rounds = asyncio.run(run())
+    assert len(rounds) == 1
+    assert cc.currentJob is None
+
+def test_mock_server_simulation():
+    from nutch.mockserver import MockNutchServer
+
+    with MockNutchServer(defaultDuration=0, durations={'FETCH': 0.2}, linksPerPage=3) as mock:
+        nt = nutch.Nutch(serverEndpoint=mock.endpoint)
+        cc = nt.Crawl(['http://a.example.com/', 'http://b.example.com/'], rounds=2, index=False, roundStats=True)
+        cc.sleepTime = 0.05
+        cc.waitAll()
+        assert cc.roundReports[0].statsDelta['totalUrls'] == 2 + 6
+        assert cc.roundReports[1].statsDelta['status']['2']['count'] == 6
+        fetch = cc.roundReports[0].phases[2]
+        assert fetch.jobType == 'FETCH' and fetch.duration >= 0.15
+
+    with MockNutchServer(defaultDuration=0, failureRate=1) as mock:
+        nt = nutch.Nutch(serverEndpoint=mock.endpoint)
+        cc = nt.Crawl('http://a.example.com/')
+        cc.sleepTime = 0
+        with pytest.raises(nutch.nutch.NutchCrawlException) as e:
+            cc.waitAll()
+        assert e.value.current_job.info()['state'] == 'FAILED'
+
+    with MockNutchServer(errorRate=1) as mock:
+        server = nutch.Server(mock.endpoint, retryPolicy=nutch.RetryPolicy(1, backoff=0))
+        with pytest.raises(nutch.NutchException) as e:
+            server.call('get', '/admin')
+        assert e.value.status_code == 503
+        assert mock.requestCount == 2
+
 @slow
 def test_crawl_client():
     cc = get_crawl_client()